@@ -1,8 +1,35 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from app.config.config import MODEL_PRELOAD
+from app.thread_budget import budget, apply_environment, apply_runtime
+
+# OpenMP/BLAS read their thread counts when first loaded, so export them before numpy and torch are imported
+apply_environment(budget.native_threads)
+
 from app.routes import router
+from app.metrics import REQUESTS, REQUESTS_IN_FLIGHT, REQUEST_SECONDS
+from app.match_logic.model_registry import registry
+from app.match_logic.shoe_model_prediction import embedding_index
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Model loaders re-apply these once they have imported torch
+    apply_runtime(budget.native_threads, budget.torch_interop_threads)
+    print(f"[THREADS] Profile '{budget.profile}': {budget.match_workers} concurrent matches x "
+          f"{budget.native_threads} native threads on {budget.cpus} cores")
+    # Load YOLO, the attribute model and rembg in parallel in the background;
+    # /readyz reports when they are warm. Models the pre-fork parent already
+    # loaded are warmed here even without preloading, or they would never be ready
+    registry.start(load_pending=MODEL_PRELOAD)
+    yield
+    if embedding_index is not None:
+        embedding_index.save()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS Configuration (update allowed_origins in prod)
 app.add_middleware(
@@ -15,3 +42,22 @@ app.add_middleware(
 
 # Register API routes
 app.include_router(router)
+
+# Unknown paths share one label so scanners cannot blow up metric cardinality
+_known_paths = {route.path for route in app.routes}
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    path = request.url.path if request.url.path in _known_paths else "other"
+    REQUESTS_IN_FLIGHT.inc(path=path)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec(path=path)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, path=path)
+        REQUESTS.inc(path=path, status=str(status))
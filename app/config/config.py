@@ -3,8 +3,127 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 API_KEY = os.getenv("SOCKMATCH_API_KEY")
 ALLOWED_CLIENT = "sock-match-ai"
 
 # Allowed image types
 ALLOWED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.webp']
+
+# Attribute model micro-batching (concurrent requests share one forward pass)
+MODEL_BATCHING_ENABLED = _env_bool("SOCKMATCH_MODEL_BATCHING", True)
+MODEL_BATCH_MAX_SIZE = int(os.getenv("SOCKMATCH_MODEL_BATCH_MAX_SIZE", 8))
+MODEL_BATCH_MAX_WAIT_MS = float(os.getenv("SOCKMATCH_MODEL_BATCH_MAX_WAIT_MS", 5))
+
+# CPU thread budget (app/thread_budget.py): one profile sizes every native thread pool.
+# "latency": few concurrent requests, each op multi-threaded; "throughput": one thread per op,
+# as many concurrent requests as cores. Thread and pool settings below left at 0 take the profile's value.
+THREAD_PROFILE = os.getenv("SOCKMATCH_THREAD_PROFILE", "latency")
+THREAD_BUDGET_CPUS = int(os.getenv("SOCKMATCH_THREAD_BUDGET_CPUS", 0))  # 0 = os.cpu_count()
+
+# /match worker pool and admission control
+MATCH_MAX_WORKERS = int(os.getenv("SOCKMATCH_MATCH_WORKERS", 0))
+MATCH_MAX_QUEUE = int(os.getenv("SOCKMATCH_MATCH_QUEUE", 8))
+MATCH_RETRY_AFTER_SECONDS = int(os.getenv("SOCKMATCH_RETRY_AFTER_SECONDS", 2))
+
+# Largest accepted upload, in bytes
+MAX_UPLOAD_BYTES = int(os.getenv("SOCKMATCH_MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+
+# /match/batch: images per request, zip size, and the pipeline stage pools
+BATCH_MAX_IMAGES = int(os.getenv("SOCKMATCH_BATCH_MAX_IMAGES", 256))
+BATCH_MAX_ZIP_BYTES = int(os.getenv("SOCKMATCH_BATCH_MAX_ZIP_BYTES", 512 * 1024 * 1024))
+# Stage pool sizes: 0 = from the thread profile (app/thread_budget.py)
+BATCH_DECODE_WORKERS = int(os.getenv("SOCKMATCH_BATCH_DECODE_WORKERS", 0))
+BATCH_DETECT_BATCH_SIZE = int(os.getenv("SOCKMATCH_BATCH_DETECT_BATCH_SIZE", 8))
+BATCH_DETECT_MAX_WAIT_MS = float(os.getenv("SOCKMATCH_BATCH_DETECT_MAX_WAIT_MS", 10))
+BATCH_REMBG_WORKERS = int(os.getenv("SOCKMATCH_BATCH_REMBG_WORKERS", 0))
+BATCH_ATTRIBUTE_WORKERS = int(os.getenv("SOCKMATCH_BATCH_ATTRIBUTE_WORKERS", 0))
+
+# Resolution policy: "capped" gives each stage a downscaled copy (longest side in pixels, 0 = no cap),
+# "full" keeps the original resolution everywhere (high-fidelity mode)
+RESOLUTION_MODE = os.getenv("SOCKMATCH_RESOLUTION_MODE", "capped")
+DETECT_MAX_SIDE = int(os.getenv("SOCKMATCH_DETECT_MAX_SIDE", 1280))
+REMBG_MAX_SIDE = int(os.getenv("SOCKMATCH_REMBG_MAX_SIDE", 1024))
+COLORS_MAX_SIDE = int(os.getenv("SOCKMATCH_COLORS_MAX_SIDE", 512))
+SHAPE_MAX_SIDE = int(os.getenv("SOCKMATCH_SHAPE_MAX_SIDE", 768))  # height and design
+
+# Shoe mask source: "rembg" (YOLO box, then U2-Net on the crop) or "detector"
+# (masks from an ultralytics -seg checkpoint in one pass, no rembg)
+SEGMENTATION_MODE = os.getenv("SOCKMATCH_SEGMENTATION_MODE", "rembg")
+SEG_MODEL_PATH = os.getenv(
+    "SOCKMATCH_SEG_MODEL_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "model", "model-seg.pt"))
+)
+
+# Multi-shoe mode (/match?multi=true): analyse every confident detection, with overlapping
+# boxes and look-alike boxes (the two shoes of a pair) sharing one analysis
+MULTI_SHOE_DEFAULT = _env_bool("SOCKMATCH_MULTI_SHOE", False)
+MULTI_SHOE_MAX_SHOES = int(os.getenv("SOCKMATCH_MULTI_SHOE_MAX_SHOES", 8))
+MULTI_SHOE_MERGE_IOU = float(os.getenv("SOCKMATCH_MULTI_SHOE_MERGE_IOU", 0.5))
+MULTI_SHOE_APPEARANCE_THRESHOLD = float(os.getenv("SOCKMATCH_MULTI_SHOE_APPEARANCE_THRESHOLD", 0.9))  # > 1 disables
+MULTI_SHOE_WORKERS = int(os.getenv("SOCKMATCH_MULTI_SHOE_WORKERS", 0))  # 0 = from the thread profile
+
+# Shared stage scheduler for per-request analysis tasks: pool size per resource class.
+# "python" tasks (GIL-bound, e.g. KMeans) can run in a process pool instead of threads
+STAGE_PYTHON_WORKERS = int(os.getenv("SOCKMATCH_STAGE_PYTHON_WORKERS", 0))
+STAGE_PYTHON_EXECUTOR = os.getenv("SOCKMATCH_STAGE_PYTHON_EXECUTOR", "thread")
+STAGE_NATIVE_WORKERS = int(os.getenv("SOCKMATCH_STAGE_NATIVE_WORKERS", 0))
+STAGE_INFERENCE_WORKERS = int(os.getenv("SOCKMATCH_STAGE_INFERENCE_WORKERS", 0))  # mostly waiting on the micro-batcher
+
+# Background removal (rembg): u2net, u2netp, silueta or isnet
+REMBG_MODEL = os.getenv("SOCKMATCH_REMBG_MODEL", "u2net")
+REMBG_INTRA_OP_THREADS = int(os.getenv("SOCKMATCH_REMBG_INTRA_OP_THREADS", 0))
+REMBG_INTER_OP_THREADS = int(os.getenv("SOCKMATCH_REMBG_INTER_OP_THREADS", 1))
+
+# In-process result cache for repeated uploads ("exact" byte hash or "perceptual" dHash)
+RESULT_CACHE_ENABLED = _env_bool("SOCKMATCH_RESULT_CACHE", True)
+RESULT_CACHE_MODE = os.getenv("SOCKMATCH_RESULT_CACHE_MODE", "exact")
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("SOCKMATCH_RESULT_CACHE_MAX_ENTRIES", 1024))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("SOCKMATCH_RESULT_CACHE_TTL_SECONDS", 3600))
+RESULT_CACHE_MAX_HAMMING = int(os.getenv("SOCKMATCH_RESULT_CACHE_MAX_HAMMING", 4))
+
+# Embedding near-duplicate cache: a crop whose ResNet backbone embedding is within this cosine
+# distance of a stored shoe's reuses that shoe's model predictions (same shoe, photographed
+# differently), so its category/type labels stay consistent. Colours, height and design always
+# come from the new crop's pixels. With a path, the index is kept in that .npz file across restarts
+EMBEDDING_CACHE_ENABLED = _env_bool("SOCKMATCH_EMBEDDING_CACHE", False)
+EMBEDDING_CACHE_MAX_DISTANCE = float(os.getenv("SOCKMATCH_EMBEDDING_CACHE_MAX_DISTANCE", 0.05))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("SOCKMATCH_EMBEDDING_CACHE_MAX_ENTRIES", 5000))
+EMBEDDING_CACHE_PATH = os.getenv("SOCKMATCH_EMBEDDING_CACHE_PATH", "")
+EMBEDDING_CACHE_SAVE_EVERY = int(os.getenv("SOCKMATCH_EMBEDDING_CACHE_SAVE_EVERY", 50))  # new entries per save
+
+# How often (seconds) the style config file is checked for changes; 0 checks on every match
+STYLE_CONFIG_RELOAD_INTERVAL = float(os.getenv("SOCKMATCH_STYLE_CONFIG_RELOAD_INTERVAL", 2))
+
+# Colour extraction: "kmeans" (full-pixel, n_init=20), "subsample", "minibatch" or "histogram"
+COLOR_STRATEGY = os.getenv("SOCKMATCH_COLOR_STRATEGY", "subsample")
+COLOR_MAX_PIXELS = int(os.getenv("SOCKMATCH_COLOR_MAX_PIXELS", 20000))
+COLOR_KMEANS_N_INIT = int(os.getenv("SOCKMATCH_COLOR_KMEANS_N_INIT", 4))  # restarts for "subsample" and "minibatch"
+COLOR_RANDOM_SEED = int(os.getenv("SOCKMATCH_COLOR_RANDOM_SEED", 0))
+
+# Attribute model backend: "torch" (best_shoe_model.pth) or "onnx" (exported by utils/export_onnx.py)
+MODEL_BACKEND = os.getenv("SOCKMATCH_MODEL_BACKEND", "torch")
+MODEL_ONNX_INTRA_OP_THREADS = int(os.getenv("SOCKMATCH_MODEL_ONNX_INTRA_OP_THREADS", 0))
+MODEL_ONNX_INTER_OP_THREADS = int(os.getenv("SOCKMATCH_MODEL_ONNX_INTER_OP_THREADS", 1))
+
+# Attribute model precision (torch backend): "fp32" or "int8"
+# int8 = dynamic quantisation of the heads + static quantisation of the backbone,
+# calibrated on the images in MODEL_CALIBRATION_DIR. Those must be background-removed
+# shoe crops like the ones served; with no directory set only the heads are quantised
+MODEL_PRECISION = os.getenv("SOCKMATCH_MODEL_PRECISION", "fp32")
+MODEL_CALIBRATION_DIR = os.getenv("SOCKMATCH_MODEL_CALIBRATION_DIR", "")
+
+# Model registry: load YOLO, the attribute model and rembg in parallel at startup
+MODEL_PRELOAD = _env_bool("SOCKMATCH_MODEL_PRELOAD", True)
+MODEL_WARMUP = _env_bool("SOCKMATCH_MODEL_WARMUP", True)
+
+# Pre-fork serving: worker processes forked from a parent that already holds the models
+WORKERS = int(os.getenv("SOCKMATCH_WORKERS", 1))
+WORKER_THREADS = int(os.getenv("SOCKMATCH_WORKER_THREADS", 0))  # torch/OpenCV/OpenMP/BLAS threads; 0 = from profile
@@ -0,0 +1,60 @@
+import logging
+import onnxruntime as ort
+from PIL import Image
+from rembg import remove
+from rembg.sessions import sessions_class
+from app.config.config import REMBG_MODEL, SEGMENTATION_MODE
+from app.metrics import timed
+from app.thread_budget import budget
+from .model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Config name -> rembg session name
+SUPPORTED_MODELS = {
+    "u2net": "u2net",
+    "u2netp": "u2netp",
+    "silueta": "silueta",
+    "isnet": "isnet-general-use",
+}
+
+
+def create_session(model: str = REMBG_MODEL,
+                   intra_op_threads: int = budget.rembg_intra_op_threads,
+                   inter_op_threads: int = budget.rembg_inter_op_threads):
+    """Build a rembg session with explicit ONNX Runtime thread counts."""
+    if model not in SUPPORTED_MODELS:
+        raise ValueError(f"Unsupported rembg model '{model}'. Choose from: {', '.join(SUPPORTED_MODELS)}")
+    model_name = SUPPORTED_MODELS[model]
+
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = intra_op_threads
+    sess_opts.inter_op_num_threads = inter_op_threads
+    sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+    # rembg.new_session only honours OMP_NUM_THREADS, so build the session class directly
+    for session_class in sessions_class:
+        if session_class.name() == model_name:
+            return session_class(model_name, sess_opts)
+    raise ValueError(f"rembg does not provide a session for '{model_name}'")
+
+
+def get_session():
+    """Process-wide background-removal session, created by the registry at startup or on first use."""
+    return registry.get("rembg")
+
+
+def warm_up(session=None):
+    """Run one dummy inference so the first request does not pay for graph initialisation."""
+    session = session or get_session()
+    remove(Image.new("RGB", (320, 320), (127, 127, 127)), session=session)
+
+
+@timed("rembg")
+def remove_background(image: Image.Image, session=None) -> Image.Image:
+    """Return an RGBA image with the background made transparent."""
+    return remove(image, session=session or get_session())
+
+
+# Not preloaded when the detector supplies the masks; still loads on demand if a detection has none
+registry.register("rembg", create_session, warm_up, preload=SEGMENTATION_MODE != "detector")
@@ -0,0 +1,109 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config.config import BATCH_DETECT_BATCH_SIZE, BATCH_DETECT_MAX_WAIT_MS
+from app.thread_budget import budget
+from .batching import MicroBatcher
+from .image_preprocessing import ImageSource, load_image, detect_shoes, remove_shoe_background
+from .matcher import SockRecommender, get_recommender
+
+logger = logging.getLogger(__name__)
+
+
+def _then(upstream: Future, submit: Callable[[Any], Future]) -> Future:
+    """Future for submit(upstream.result()); an upstream failure skips the stage and propagates"""
+    downstream = Future()
+
+    def _copy(f: Future):
+        if f.exception() is not None:
+            downstream.set_exception(f.exception())
+        else:
+            downstream.set_result(f.result())
+
+    def _forward(f: Future):
+        if f.exception() is not None:
+            downstream.set_exception(f.exception())
+            return
+        try:
+            submit(f.result()).add_done_callback(_copy)
+        except Exception as e:
+            downstream.set_exception(e)
+
+    upstream.add_done_callback(_forward)
+    return downstream
+
+
+class BatchPipeline:
+    """
+    Staged executor for many images at once:
+    decode -> YOLO (batched across images) -> background removal -> attributes -> rules.
+    Each stage has its own long-lived pool and an image moves on as soon as its
+    previous stage finishes, so image N is decoded while image N-1 is in rembg.
+    The attribute model is batched across images by its own micro-batcher.
+    A failure only affects its own image, which gets match_socks' error response.
+    """
+
+    def __init__(self, recommender: SockRecommender, decode_workers: int = 2, detect_batch_size: int = 8,
+                 detect_max_wait_ms: float = 10, rembg_workers: int = 2, attribute_workers: int = 4):
+        self.recommender = recommender
+        self.decode_pool = ThreadPoolExecutor(max(1, decode_workers), thread_name_prefix="batch-decode")
+        self.detector = MicroBatcher(detect_shoes, max_batch_size=detect_batch_size,
+                                     max_wait_ms=detect_max_wait_ms, name="yolo-batcher")
+        self.rembg_pool = ThreadPoolExecutor(max(1, rembg_workers), thread_name_prefix="batch-rembg")
+        self.attribute_pool = ThreadPoolExecutor(max(1, attribute_workers), thread_name_prefix="batch-attributes")
+
+    def _submit(self, image: ImageSource, gender: str) -> Future:
+        decoded = self.decode_pool.submit(load_image, image)
+        detections = _then(decoded, self.detector.submit)
+        shoe = _then(detections, lambda d: self.rembg_pool.submit(remove_shoe_background, decoded.result(), d))
+        return _then(shoe, lambda rgba: self.attribute_pool.submit(self._recommend, rgba, gender))
+
+    def _recommend(self, rgba, gender: str) -> Dict:
+        return self.recommender.analyse_crop(rgba, gender)
+
+    def run(self, images: List[ImageSource], gender: str = "unisex") -> List[Dict]:
+        """One match_socks-shaped result per image, in input order."""
+        results: List[Optional[Dict]] = [None] * len(images)
+        cache_keys = [None] * len(images)
+        pending = {}
+
+        for i, image in enumerate(images):
+            image, cache_keys[i], results[i] = self.recommender.cache_lookup(image, gender)
+            if results[i] is None:
+                pending[i] = self._submit(image, gender)
+
+        for i, future in pending.items():
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = self.recommender.error_response(e, gender)
+                continue
+            self.recommender.cache_store(cache_keys[i], results[i])
+
+        return results
+
+    def stats(self) -> Dict:
+        return {"detector": self.detector.stats()}
+
+
+_pipeline: Optional[BatchPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_batch_pipeline() -> BatchPipeline:
+    """Process-wide pipeline, created on first use (after fork in pre-forked workers)."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = BatchPipeline(
+                    get_recommender(),
+                    decode_workers=budget.batch_decode_workers,
+                    detect_batch_size=BATCH_DETECT_BATCH_SIZE,
+                    detect_max_wait_ms=BATCH_DETECT_MAX_WAIT_MS,
+                    rembg_workers=budget.batch_rembg_workers,
+                    attribute_workers=budget.batch_attribute_workers
+                )
+    return _pipeline
@@ -0,0 +1,121 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ("item", "future", "enqueued_at")
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent callers into batches.
+    A batch is flushed when it reaches max_batch_size or when the oldest
+    item has waited max_wait_ms, whichever comes first. process_batch
+    receives the list of items and must return one result per item.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0, name: str = "micro-batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._start()
+        # Threads do not survive fork(); pre-forked workers get a fresh scheduler
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = Counter()
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        pending = _Pending(item)
+        self._queue.put(pending)
+        return pending.future
+
+    def __call__(self, item: Any, timeout: float = None) -> Any:
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self) -> List[_Pending]:
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Past the deadline: still take whatever is already queued.
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            waits = [started - p.enqueued_at for p in batch]
+            self._record(len(batch), waits)
+
+            try:
+                results = self.process_batch([p.item for p in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: expected {len(batch)} results, got {len(results)}")
+            except Exception as e:
+                logger.exception(f"{self.name}: batch of {len(batch)} failed: {e}")
+                for p in batch:
+                    p.future.set_exception(e)
+                continue
+
+            for p, result in zip(batch, results):
+                p.future.set_result(result)
+
+            logger.debug(f"{self.name}: batch={len(batch)} max_wait={max(waits) * 1000:.1f}ms "
+                         f"run={(time.perf_counter() - started) * 1000:.1f}ms")
+
+    def _record(self, size: int, waits: List[float]):
+        with self._lock:
+            self._batches += 1
+            self._items += size
+            self._batch_sizes[size] += 1
+            self._total_wait += sum(waits)
+            self._max_wait_seen = max(self._max_wait_seen, max(waits))
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch sizes and queue waits observed since startup."""
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "batch_size_counts": dict(sorted(self._batch_sizes.items())),
+                "mean_queue_wait_ms": round(self._total_wait / self._items * 1000, 2) if self._items else 0.0,
+                "max_queue_wait_ms": round(self._max_wait_seen * 1000, 2),
+            }
@@ -0,0 +1,112 @@
+import cv2
+import numpy as np
+from typing import List, Optional
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from .color_names import color_histogram, name_hsv_centers
+from app.config.config import COLOR_STRATEGY, COLOR_MAX_PIXELS, COLOR_KMEANS_N_INIT, COLOR_RANDOM_SEED
+
+STRATEGIES = ("kmeans", "subsample", "minibatch", "histogram")
+
+
+def hsv_to_shoe_color(h, s, v):
+    """
+    Name one OpenCV HSV colour (H in 0-179, S and V in 0-255).
+    Scalar reference; color_names classifies whole arrays with the same rules.
+    """
+    h, s, v = h * 2, s / 255.0, v / 255.0
+    if v < 0.15: return "black"
+    if v > 0.85 and s < 0.15: return "white"
+    if s < 0.2: return "gray" if v < 0.6 else "off-white"
+    if h < 15 or h >= 345:
+        return "red"
+    elif 15 <= h < 40:
+        return "brown" if (s < 0.4 or v < 0.5) else "orange"
+    elif 40 <= h < 65:
+        return "yellow"
+    elif 65 <= h < 160:
+        return "green"
+    elif 160 <= h < 200:
+        return "teal"
+    elif 200 <= h < 250:
+        return "blue"
+    elif 250 <= h < 290:
+        return "purple"
+    elif 290 <= h < 345:
+        return "pink"
+    return "neutral"
+
+
+def auto_white_balance(img: np.ndarray) -> np.ndarray:
+    """White balance correction in LAB space (expects a 1xNx3 RGB image)"""
+    lab = cv2.cvtColor(img, cv2.COLOR_RGB2LAB)
+    avg_a = np.mean(lab[:, :, 1])
+    avg_b = np.mean(lab[:, :, 2])
+    lab[:, :, 1] = lab[:, :, 1] - ((avg_a - 128) * (lab[:, :, 0] / 255.0) * 1.1)
+    lab[:, :, 2] = lab[:, :, 2] - ((avg_b - 128) * (lab[:, :, 0] / 255.0) * 1.1)
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
+
+
+def stratified_sample(pixels: np.ndarray, max_pixels: int) -> np.ndarray:
+    """
+    Keep at most max_pixels rows with a fixed stride. Opaque pixels are in
+    row-major order, so a regular stride samples evenly over the whole shoe.
+    """
+    if max_pixels <= 0 or len(pixels) <= max_pixels:
+        return pixels
+    stride = int(np.ceil(len(pixels) / max_pixels))
+    return pixels[::stride]
+
+
+def opaque_hsv_pixels(rgba_array: np.ndarray, max_pixels: int = 0) -> Optional[np.ndarray]:
+    """White-balanced HSV values (Nx3 uint8) of the opaque pixels, optionally subsampled"""
+    alpha = rgba_array[:, :, 3]
+    rgb_pixels = rgba_array[alpha > 0][:, :3]
+    if len(rgb_pixels) < 10:
+        return None
+
+    rgb_pixels = stratified_sample(rgb_pixels, max_pixels)
+    balanced = auto_white_balance(np.ascontiguousarray(rgb_pixels).reshape(1, -1, 3)).reshape(-1, 3)
+    return cv2.cvtColor(balanced.reshape(1, -1, 3), cv2.COLOR_RGB2HSV).reshape(-1, 3)
+
+
+def names_by_population(centers: np.ndarray, labels: np.ndarray, num_colors: int) -> List[str]:
+    # Most populous cluster first, so primary_color is the dominant colour
+    counts = np.bincount(labels, minlength=len(centers))
+    order = np.argsort(-counts, kind="stable")
+    return name_hsv_centers(centers[order])[:num_colors]
+
+
+def extract_colors(rgba_array: np.ndarray, num_colors: int, strategy: str = COLOR_STRATEGY) -> List[str]:
+    """
+    Name the dominant colours of the opaque pixels.
+    - kmeans: KMeans(n_init=20) on every opaque pixel (original behaviour)
+    - subsample: seeded KMeans on a stratified pixel sample
+    - minibatch: seeded MiniBatchKMeans on a stratified pixel sample
+    - histogram: count named palette colours per pixel, no clustering
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown colour strategy '{strategy}'. Choose from: {', '.join(STRATEGIES)}")
+
+    if strategy == "kmeans":
+        hsv = opaque_hsv_pixels(rgba_array)
+        if hsv is None:
+            return ["unknown"]
+        kmeans = KMeans(n_clusters=num_colors, n_init=20)
+        kmeans.fit(hsv)
+        return name_hsv_centers(kmeans.cluster_centers_)[:num_colors]
+
+    hsv = opaque_hsv_pixels(rgba_array, COLOR_MAX_PIXELS)
+    if hsv is None:
+        return ["unknown"]
+
+    if strategy == "histogram":
+        histogram = color_histogram(hsv)
+        ranked = sorted((name for name in histogram if histogram[name] > 0), key=lambda n: -histogram[n])
+        return ranked[:num_colors]
+
+    if strategy == "minibatch":
+        model = MiniBatchKMeans(n_clusters=num_colors, n_init=COLOR_KMEANS_N_INIT, batch_size=2048, random_state=COLOR_RANDOM_SEED)
+    else:
+        model = KMeans(n_clusters=num_colors, n_init=COLOR_KMEANS_N_INIT, random_state=COLOR_RANDOM_SEED)
+    labels = model.fit_predict(hsv)
+    return names_by_population(model.cluster_centers_, labels, num_colors)
@@ -0,0 +1,133 @@
+import numpy as np
+from typing import Dict, List
+
+# Names returned by hsv_to_shoe_color; a pixel's colour code is its index here
+SHOE_COLOR_NAMES = (
+    "black", "white", "gray", "off-white", "red", "brown", "orange",
+    "yellow", "green", "teal", "blue", "purple", "pink", "neutral",
+)
+_NAME_ARRAY = np.array(SHOE_COLOR_NAMES)
+_NEUTRAL = SHOE_COLOR_NAMES.index("neutral")
+
+
+def _hue_rules(h: np.ndarray, brown: np.ndarray) -> List[np.ndarray]:
+    # Shared hue ladder; entries line up with SHOE_COLOR_NAMES[4:13]
+    return [
+        (h < 15) | (h >= 345),
+        (h < 40) & brown,
+        h < 40,
+        h < 65,
+        h < 160,
+        h < 200,
+        h < 250,
+        h < 290,
+        h < 345,
+    ]
+
+
+def shoe_color_codes(h, s, v) -> np.ndarray:
+    """
+    Vectorised hsv_to_shoe_color: OpenCV HSV (H 0-179, S/V 0-255) arrays of
+    any shape, integer or float, to colour codes. Uses the same float64
+    arithmetic as the scalar version, so results are identical.
+    """
+    h = np.asarray(h, dtype=np.float64) * 2
+    s = np.asarray(s, dtype=np.float64) / 255.0
+    v = np.asarray(v, dtype=np.float64) / 255.0
+    conditions = [
+        v < 0.15,
+        (v > 0.85) & (s < 0.15),
+        (s < 0.2) & (v < 0.6),
+        s < 0.2,
+    ] + _hue_rules(h, (s < 0.4) | (v < 0.5))
+    return np.select(conditions, list(range(len(conditions))), default=_NEUTRAL).astype(np.uint8)
+
+
+def _channel_bins(values: np.ndarray, signature: np.ndarray):
+    """Group channel values whose threshold comparisons all agree into one bin"""
+    _, first, bins = np.unique(signature, axis=0, return_index=True, return_inverse=True)
+    return bins.reshape(-1), values[first]
+
+
+def _build_hsv_lut():
+    """
+    Factorised lookup table for uint8 OpenCV HSV. Each channel maps to a bin
+    of values that behave the same under every threshold; the bins are
+    pre-offset so a pixel's code is flat_table[H_LUT[h] + S_LUT[s] + V_LUT[v]].
+    """
+    h_values = np.arange(180)
+    sv_values = np.arange(256)
+    h2, s1, v1 = h_values * 2.0, sv_values / 255.0, sv_values / 255.0
+
+    h_bins, h_reps = _channel_bins(h_values, np.stack(
+        [(h2 < 15) | (h2 >= 345)] + [h2 < t for t in (40, 65, 160, 200, 250, 290, 345)], axis=1))
+    s_bins, s_reps = _channel_bins(sv_values, np.stack([s1 < t for t in (0.15, 0.2, 0.4)], axis=1))
+    v_bins, v_reps = _channel_bins(sv_values, np.stack(
+        [v1 < 0.15, v1 > 0.85, v1 < 0.6, v1 < 0.5], axis=1))
+
+    n_s, n_v = len(s_reps), len(v_reps)
+    hh, ss, vv = np.meshgrid(h_reps, s_reps, v_reps, indexing="ij")
+    flat_table = shoe_color_codes(hh, ss, vv).reshape(-1)
+
+    h_lut = (h_bins * n_s * n_v).astype(np.intp)
+    s_lut = (s_bins * n_v).astype(np.intp)
+    v_lut = v_bins.astype(np.intp)
+    return flat_table, h_lut, s_lut, v_lut
+
+
+_FLAT_TABLE, _H_LUT, _S_LUT, _V_LUT = _build_hsv_lut()
+
+
+def hsv_pixel_codes(hsv: np.ndarray) -> np.ndarray:
+    """Colour codes for a uint8 OpenCV HSV array of shape (..., 3) via the lookup table"""
+    return _FLAT_TABLE[_H_LUT[hsv[..., 0]] + _S_LUT[hsv[..., 1]] + _V_LUT[hsv[..., 2]]]
+
+
+def name_hsv_pixels(hsv: np.ndarray) -> np.ndarray:
+    """Colour names for a uint8 OpenCV HSV array of shape (..., 3)"""
+    return _NAME_ARRAY[hsv_pixel_codes(hsv)]
+
+
+def name_hsv_centers(centers: np.ndarray) -> List[str]:
+    """Colour names for float HSV rows such as KMeans cluster centres"""
+    centers = np.asarray(centers)
+    return _NAME_ARRAY[shoe_color_codes(centers[:, 0], centers[:, 1], centers[:, 2])].tolist()
+
+
+def color_histogram(hsv: np.ndarray, weights: np.ndarray = None) -> Dict[str, int]:
+    """Pixel count per colour name for a uint8 OpenCV HSV array of shape (..., 3)"""
+    codes = hsv_pixel_codes(hsv).reshape(-1)
+    counts = np.bincount(codes, weights=weights, minlength=len(SHOE_COLOR_NAMES))
+    return {name: counts[i].item() for i, name in enumerate(SHOE_COLOR_NAMES)}
+
+
+def name_rgb_pixels(rgb: np.ndarray) -> np.ndarray:
+    """
+    Vectorised rgb_to_name for an RGB array of shape (..., 3) in 0-255.
+    Hue/saturation/value follow colorsys.rgb_to_hsv exactly.
+    """
+    rgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = rgb.max(axis=-1)
+    minc = rgb.min(axis=-1)
+    rangec = maxc - minc
+    chromatic = rangec > 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.where(chromatic, rangec / np.where(maxc > 0, maxc, 1), 0.0)
+        safe_range = np.where(chromatic, rangec, 1)
+        rc = (maxc - r) / safe_range
+        gc = (maxc - g) / safe_range
+        bc = (maxc - b) / safe_range
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = np.where(chromatic, (h / 6.0) % 1.0, 0.0) * 360
+    v = maxc
+
+    conditions = [
+        v < 0.15,
+        (v > 0.9) & (s < 0.1),
+        (s < 0.2) & (v < 0.7),
+        s < 0.2,
+    ] + _hue_rules(h, ~(s > 0.5))
+    codes = np.select(conditions, list(range(len(conditions))), default=_NEUTRAL)
+    return _NAME_ARRAY[codes]
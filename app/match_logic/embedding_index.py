@@ -0,0 +1,198 @@
+import copy
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .result_cache import DEFAULT_WATCHED_PATHS
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the stored payload changes shape; saved files of another version are ignored
+INDEX_VERSION = 3
+
+
+def _normalise(vector: np.ndarray) -> Optional[np.ndarray]:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else None
+
+
+class EmbeddingIndex:
+    """
+    Near-duplicate cache keyed by the attribute model's 512-d backbone features.
+    Each entry is an L2-normalised embedding plus a JSON-serialisable payload (the
+    model predictions for that shoe); lookup() returns the payload of the closest
+    entry when its cosine distance is at most max_distance, so the same shoe
+    photographed differently gets the same labels. Entries live in a fixed-size
+    ring (oldest overwritten first). Everything is dropped when a watched file
+    (model weights) or model_key (backend, precision) changes. With a path, the
+    index is loaded from and saved to a .npz file (no pickles).
+    """
+
+    def __init__(self, dim: int = 512, max_distance: float = 0.05, max_entries: int = 5000,
+                 path: Optional[str] = None, save_every: int = 50,
+                 watched_paths: Sequence[str] = DEFAULT_WATCHED_PATHS, model_key: str = ""):
+        self.dim = dim
+        self.max_distance = max_distance
+        self.max_entries = max(1, max_entries)
+        self.path = path or None
+        self.save_every = max(0, save_every)
+        self.watched_paths = list(watched_paths)
+        self.model_key = model_key
+
+        self._lock = threading.Lock()
+        self._fingerprint = self._current_fingerprint()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._reset()
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    def _reset(self):
+        self._vectors = np.zeros((self.max_entries, self.dim), dtype=np.float32)
+        self._payloads: List[Optional[Dict]] = [None] * self.max_entries
+        self._count = 0
+        self._next = 0
+        self._unsaved = 0
+
+    def _current_fingerprint(self) -> Tuple:
+        fingerprint = [("model_key", self.model_key, None)]
+        for path in self.watched_paths:
+            try:
+                st = os.stat(path)
+                fingerprint.append((os.path.basename(path), st.st_mtime_ns, st.st_size))
+            except OSError:
+                fingerprint.append((os.path.basename(path), None, None))
+        return tuple(fingerprint)
+
+    def _check_fingerprint(self):
+        current = self._current_fingerprint()
+        if current != self._fingerprint:
+            self._reset()
+            self._fingerprint = current
+            self._invalidations += 1
+
+    def lookup(self, embedding: np.ndarray) -> Optional[Tuple[Dict, float]]:
+        """(stored payload, cosine distance) of the nearest entry within max_distance, or None"""
+        query = _normalise(embedding)
+        with self._lock:
+            self._check_fingerprint()
+            if query is None or not self._count or query.shape[0] != self.dim:
+                self._misses += 1
+                return None
+
+            # Vectors are unit length, so the dot product is the cosine similarity
+            similarity = self._vectors[:self._count] @ query
+            best = int(np.argmax(similarity))
+            distance = 1.0 - float(similarity[best])
+            if distance > self.max_distance:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return copy.deepcopy(self._payloads[best]), distance
+
+    def add(self, embedding: np.ndarray, payload: Dict):
+        vector = _normalise(embedding)
+        if vector is None or vector.shape[0] != self.dim:
+            return
+        with self._lock:
+            self._check_fingerprint()
+            slot = self._next
+            self._vectors[slot] = vector
+            self._payloads[slot] = copy.deepcopy(payload)
+            self._next = (slot + 1) % self.max_entries
+            self._count = min(self._count + 1, self.max_entries)
+            self._unsaved += 1
+            save = self.path is not None and self.save_every and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def reuse(self, predicted: Dict, embedding: Optional[np.ndarray]) -> Dict:
+        """The stored predictions of a near-duplicate shoe, else predicted (which is then stored)"""
+        if embedding is None or not predicted:
+            return predicted
+        hit = self.lookup(embedding)
+        if hit is not None:
+            return hit[0]
+        self.add(embedding, predicted)
+        return predicted
+
+    def save(self):
+        """Write the index to path atomically (a temporary file renamed over the old one)"""
+        if not self.path:
+            return
+        with self._lock:
+            count = self._count
+            arrays = {
+                "vectors": self._vectors[:count].copy(),
+                "payloads": np.array([json.dumps(p) for p in self._payloads[:count]], dtype=np.str_),
+                "meta": np.array(json.dumps({"version": INDEX_VERSION, "next": self._next,
+                                             "fingerprint": self._fingerprint})),
+            }
+            self._unsaved = 0
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save the embedding index to {self.path}: {e}")
+
+    def load(self):
+        """Restore a saved index; files written for other model weights or style config are ignored"""
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                vectors = data["vectors"]
+                payloads = [json.loads(p) for p in data["payloads"].tolist()]
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable embedding index {self.path}: {e}")
+            return
+
+        fingerprint = tuple(tuple(entry) for entry in meta.get("fingerprint", []))
+        if meta.get("version") != INDEX_VERSION:
+            logger.info(f"Embedding index {self.path} has an older format; starting empty")
+            return
+        if fingerprint != self._fingerprint or vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            logger.info(f"Embedding index {self.path} was built for another model; starting empty")
+            return
+
+        # Keep the newest entries if the saved index is larger than this one
+        count = len(vectors)
+        order = np.roll(np.arange(count), -meta.get("next", 0) % count) if count else np.arange(0)
+        order = order[-self.max_entries:]
+        with self._lock:
+            self._reset()
+            n = len(order)
+            self._vectors[:n] = vectors[order]
+            for slot, index in enumerate(order.tolist()):
+                self._payloads[slot] = payloads[index]
+            self._count = n
+            self._next = n % self.max_entries
+        logger.info(f"Loaded {n} embeddings from {self.path}")
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._invalidations += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": self._count,
+                "max_entries": self.max_entries,
+                "max_distance": self.max_distance,
+                "persistent": self.path is not None,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "invalidations": self._invalidations,
+            }
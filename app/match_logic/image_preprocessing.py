@@ -1,69 +1,210 @@
-import colorsys
 import cv2
 import numpy as np
-from typing import Dict, List,Optional
-from sklearn.cluster import KMeans
-from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 import os
-from ultralytics import YOLO
 from PIL import Image
-from rembg import remove
+from app.config.config import SEGMENTATION_MODE, SEG_MODEL_PATH
+from app.metrics import stage_timer, timed
+from app.thread_budget import reapply_runtime
 from .shoe_model_prediction import predict_model_properties
+from .background_removal import remove_background
+from . import color_extraction
+from .model_registry import registry
+from .color_names import name_rgb_pixels
+from .resolution import fit_within, for_stage, max_side, boxes_to_original
+from .segmentation import masked_crop, scale_polygon
+from .shape_features import extract_shape_features, classify_height, classify_design
+from .stage_scheduler import Task, scheduler
 
 
 
 
-# Initialize YOLO model (keep your existing model loading code)
+# YOLO model path (the model itself is loaded by the registry, in the background at startup)
 script_dir = os.path.dirname(os.path.abspath(__file__))
 yolo_model_path = os.path.abspath(os.path.join(script_dir, "..", "..", "model", "model.pt"))
-yolo_model = YOLO(yolo_model_path)
 
-# Initialize the model path
-best_model_path = os.path.abspath(os.path.join(script_dir, "..", "..", "model", "best_shoe_model.pth"))
 
+def _load_yolo(path: str = yolo_model_path):
+    from ultralytics import YOLO
+    model = YOLO(path)
+    reapply_runtime()  # ultralytics has just imported torch
+    return model
+
+
+def _warm_up_yolo(model):
+    model(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+
+
+# Only the detector the configured segmentation mode uses is loaded at startup;
+# in "detector" mode rembg and the plain YOLO model are skipped entirely
+registry.register("yolo", _load_yolo, _warm_up_yolo, preload=SEGMENTATION_MODE != "detector")
+registry.register("yolo_seg", lambda: _load_yolo(SEG_MODEL_PATH), _warm_up_yolo,
+                  preload=SEGMENTATION_MODE == "detector")
+
+
+def get_yolo_model():
+    return registry.get("yolo")
+
+
+def get_seg_model():
+    return registry.get("yolo_seg")
+
+
+
+# Anything the pipeline can start from: a file path, encoded image bytes or a decoded BGR array
+ImageSource = Union[str, bytes, np.ndarray]
+
+
+@timed("decode")
+def decode_image(data: bytes) -> np.ndarray:
+    """Decode encoded image bytes (JPEG/PNG/...) straight from memory into a BGR array"""
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("❌ Could not decode image data.")
+    return image
+
+
+@timed("decode")
+def decode_shoe_crop(data: bytes) -> np.ndarray:
+    """
+    Decode a background-removed shoe crop (PNG with alpha) into the RGBA array
+    remove_shoe_background would have produced for it.
+    """
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError("❌ Could not decode image data.")
+    if image.ndim != 3 or image.shape[2] != 4:
+        raise ValueError("❌ Crop has no alpha channel; upload a transparent PNG.")
+    if image.dtype == np.uint16:
+        image = (image >> 8).astype(np.uint8)
+    rgba = cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA)
+    if not np.any(rgba[:, :, 3] > 0):
+        raise ValueError("❌ Crop has no visible pixels.")
+    return rgba
+
+
+def load_image(source: ImageSource) -> np.ndarray:
+    """Return a BGR array for a path, encoded bytes or an already decoded array"""
+    if isinstance(source, np.ndarray):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return decode_image(bytes(source))
+
+    with stage_timer("decode"):
+        image = cv2.imread(source)
+    if image is None:
+        raise FileNotFoundError(f"❌ Image not found: {source}")
+    return image
 
 
 def detect_and_process_shoe(image_path: str, confidence_threshold: float = 0.5) -> Optional[np.ndarray]:
     """Detects shoes and returns processed RGBA image without saving"""
+    return detect_and_process_shoe_image(load_image(image_path), confidence_threshold)
+
+
+def detect_and_process_shoe_image(image: ImageSource, confidence_threshold: float = 0.5) -> Optional[np.ndarray]:
+    """Same as detect_and_process_shoe, but starts from in-memory bytes or a BGR array"""
     print("🔍 Detecting shoes...")
 
-    image = cv2.imread(image_path)
-    if image is None:
-        raise FileNotFoundError(f"❌ Image not found: {image_path}")
+    image = load_image(image)
+    detections = detect_shoes([image], confidence_threshold)[0]
+    return remove_shoe_background(image, detections)
 
-    results = yolo_model(image)
-    detections = results[0].boxes
-    detections = [d for d in detections if d.conf >= confidence_threshold]
 
-    if not detections:
-        raise ValueError("❌ No shoes detected in the image.")
+# (x1, y1, x2, y2) in pixel coordinates of the image it was detected in
+Box = Tuple[int, int, int, int]
 
-    for detection in detections:
-        x1, y1, x2, y2 = map(int, detection.xyxy[0])
-        cropped = image[y1:y2, x1:x2]
 
-        if cropped.size == 0:
-            continue
+class Detection(NamedTuple):
+    box: Box
+    # Mask outline ((N, 2) x/y, original image coordinates) when a -seg detector found it
+    polygon: Optional[np.ndarray] = None
+    confidence: Optional[float] = None
+
 
-        # Process and remove background
-        shoe_pil = Image.fromarray(cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB))
-        shoe_no_bg = remove(shoe_pil)  # RGBA image
+@timed("yolo")
+def detect_shoes(images: List[np.ndarray], confidence_threshold: float = 0.5) -> List[List[Detection]]:
+    """
+    Run YOLO once over a list of BGR images; returns the confident detections per image.
+    YOLO sees a copy capped at the "detect" max side; boxes are in original image coordinates.
+    In "detector" segmentation mode the -seg model is used and each detection carries its mask.
+    """
+    segment = SEGMENTATION_MODE == "detector"
+    model = get_seg_model() if segment else get_yolo_model()
+    resized = [fit_within(image, max_side("detect")) for image in images]
+    results = model([small for small, _ in resized], verbose=False)
+
+    detections = []
+    for image, (_, scale), result in zip(images, resized, results):
+        keep = [i for i, d in enumerate(result.boxes) if d.conf >= confidence_threshold]
+        boxes = boxes_to_original([result.boxes[i].xyxy[0].tolist() for i in keep], scale, image.shape)
+        confidences = [float(result.boxes[i].conf) for i in keep]
+        if segment and result.masks is not None:
+            polygons = [scale_polygon(result.masks.xy[i], scale) for i in keep]
+        else:
+            polygons = [None] * len(keep)
+        detections.append([Detection(*d) for d in zip(boxes, polygons, confidences)])
+    return detections
+
+
+def remove_shoe_background(image: np.ndarray, detections: List[Detection]) -> np.ndarray:
+    """
+    Crop each detection in turn and return the first RGBA crop with visible pixels.
+    Detections with a mask use it as alpha directly; the others go through rembg.
+    """
+    if not detections:
+        raise ValueError("❌ No shoes detected in the image.")
 
-        # Convert to numpy and verify content
-        rgba = np.array(shoe_no_bg)
-        if np.any(rgba[:, :, 3] > 0):  # Check if has visible pixels
+    for detection in detections:
+        rgba = isolate_shoe(image, detection)
+        if rgba is not None:
             print("✅ Successfully processed shoe")
             return rgba
 
     raise ValueError("❌ No valid shoes were processed.")
 
-def extract_shoe_attributes(rgba_array: np.ndarray, num_colors: int = 3) -> Dict[str, any]:
+
+def isolate_shoe(image: np.ndarray, detection: Detection) -> Optional[np.ndarray]:
+    """
+    RGBA crop of one detection with the background removed, or None if it has
+    no visible pixels. Uses the detector's mask when there is one, rembg otherwise.
+    """
+    if detection.polygon is not None:
+        rgba = masked_crop(image, detection.box, detection.polygon)
+        return rgba if rgba is not None and np.any(rgba[:, :, 3] > 0) else None
+
+    x1, y1, x2, y2 = detection.box
+    cropped = image[y1:y2, x1:x2]
+
+    if cropped.size == 0:
+        return None
+
+    # Process and remove background (on a copy capped at the "rembg" max side)
+    cropped = for_stage(cropped, "rembg")
+    shoe_pil = Image.fromarray(cv2.cvtColor(cropped, cv2.COLOR_BGR2RGB))
+    shoe_no_bg = remove_background(shoe_pil)  # RGBA image
+
+    # Convert to numpy and verify content
+    rgba = np.array(shoe_no_bg)
+    return rgba if np.any(rgba[:, :, 3] > 0) else None  # Check if has visible pixels
+
+
+# on_stage(event, data) callback used to report partial results as they become available
+StageCallback = Callable[[str, Dict], None]
+
+
+def extract_shoe_attributes(rgba_array: np.ndarray, num_colors: int = 3,
+                            on_stage: Optional[StageCallback] = None,
+                            predict_properties: Callable[[np.ndarray], Dict] = predict_model_properties) -> Dict[str, any]:
     """
-    Analyze shoe attributes in parallel:
+    Analyze shoe attributes in parallel on the shared stage scheduler:
     - Colors (with improved clustering)
     - Height (based on aspect ratio)
     - Design (pattern detection)
     Returns: {'colors': [], 'height': str, 'design': str, 'error': Optional[str]}
+    on_stage, if given, receives "attributes" (colors/height/design) as soon as
+    those are known, then "model_properties" once the model has answered.
+    predict_properties replaces the attribute model call (e.g. with a slot of a batched prediction).
     """
     result = {
         "colors": [],
@@ -73,32 +214,26 @@ def extract_shoe_attributes(rgba_array: np.ndarray, num_colors: int = 3) -> Dict
     }
 
     try:
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            # Submit all analysis tasks in parallel
-            color_future = executor.submit(
-                extract_colors,
-                rgba_array,
-                num_colors
-            )
-            height_future = executor.submit(
-                calculate_height,
-                rgba_array
-            )
-            design_future = executor.submit(
-                detect_design,
-                rgba_array
-            )
-
-            model_future = executor.submit(predict_model_properties, rgba_array)
-
-            # Get results
-            result["colors"] = color_future.result()
-            result["height"] = height_future.result()
-            result["design"] = design_future.result()
-            # Only include model properties that meet confidence threshold
-            model_props = model_future.result()
-            if model_props:
-                result["model_properties"] = model_props
+        # Independent tasks on the shared scheduler, each in the pool for its kind of work
+        futures = scheduler.run({
+            "extract_colors": Task(extract_colors, "python", (rgba_array, num_colors)),
+            # Height and design share one mask/bounding box/edge-map pass
+            "shape_features": Task(analyse_shape, "native", (rgba_array,)),
+            "predict_model_properties": Task(predict_properties, "inference", (rgba_array,)),
+        })
+
+        # Get results
+        result["colors"] = futures["extract_colors"].result()
+        result["height"], result["design"] = futures["shape_features"].result()
+        if on_stage is not None:
+            on_stage("attributes", {k: result[k] for k in ("colors", "height", "design")})
+
+        # Only include model properties that meet confidence threshold
+        model_props = futures["predict_model_properties"].result()
+        if model_props:
+            result["model_properties"] = model_props
+        if on_stage is not None:
+            on_stage("model_properties", model_props or {})
 
     except Exception as e:
         result["error"] = str(e)
@@ -106,156 +241,49 @@ def extract_shoe_attributes(rgba_array: np.ndarray, num_colors: int = 3) -> Dict
     return result
 
 
+@timed("extract_colors")
 def extract_colors(rgba_array: np.ndarray, num_colors: int) -> List[str]:
-    """Improved color extraction with LAB space clustering"""
+    """Improved color extraction with LAB space clustering (strategy set by SOCKMATCH_COLOR_STRATEGY)"""
     try:
-        # Extract only opaque pixels
-        alpha = rgba_array[:, :, 3]
-        rgb_pixels = rgba_array[alpha > 0][:, :3]
-
-        if len(rgb_pixels) < 10:
-            return ["unknown"]
-
-        # White balance correction
-        def auto_white_balance(img):
-            lab = cv2.cvtColor(img, cv2.COLOR_RGB2LAB)
-            avg_a = np.mean(lab[:, :, 1])
-            avg_b = np.mean(lab[:, :, 2])
-            lab[:, :, 1] = lab[:, :, 1] - ((avg_a - 128) * (lab[:, :, 0] / 255.0) * 1.1)
-            lab[:, :, 2] = lab[:, :, 2] - ((avg_b - 128) * (lab[:, :, 0] / 255.0) * 1.1)
-            return cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
-
-        balanced = auto_white_balance(rgb_pixels.reshape(1, -1, 3)).reshape(-1, 3)
-
-        # Convert to HSV for clustering
-        hsv = cv2.cvtColor(balanced.reshape(1, -1, 3), cv2.COLOR_RGB2HSV).reshape(-1, 3)
-        kmeans = KMeans(n_clusters=num_colors, n_init=20)
-        kmeans.fit(hsv)
-
-        # Process clusters
-        def hsv_to_shoe_color(h, s, v):
-            h, s, v = h * 2, s / 255.0, v / 255.0
-            if v < 0.15: return "black"
-            if v > 0.85 and s < 0.15: return "white"
-            if s < 0.2: return "gray" if v < 0.6 else "off-white"
-            if h < 15 or h >= 345:
-                return "red"
-            elif 15 <= h < 40:
-                return "brown" if (s < 0.4 or v < 0.5) else "orange"
-            elif 40 <= h < 65:
-                return "yellow"
-            elif 65 <= h < 160:
-                return "green"
-            elif 160 <= h < 200:
-                return "teal"
-            elif 200 <= h < 250:
-                return "blue"
-            elif 250 <= h < 290:
-                return "purple"
-            elif 290 <= h < 345:
-                return "pink"
-            return "neutral"
-
-        named_colors = []
-        for center in kmeans.cluster_centers_:
-            named_colors.append(hsv_to_shoe_color(*center))
-
-        return named_colors[:num_colors]
+        return color_extraction.extract_colors(for_stage(rgba_array, "colors"), num_colors)
 
     except Exception as e:
         print(f"Color extraction error: {e}")
         return ["unknown"]
-from skimage.measure import label, regionprops
-
 def calculate_height(rgba_array: np.ndarray) -> str:
-    """Estimate shoe height more robustly using bounding box and aspect ratio."""
+    """Estimate shoe height from the bounding box aspect ratio (see shape_features)."""
     try:
-        gray = np.mean(rgba_array[:, :, :3], axis=2)  # Ignore alpha
-        mask = gray > 20  # Simple threshold to isolate shoe pixels
-        labeled = label(mask)
-        props = regionprops(labeled)
-
-        if not props:
-            return "unknown"
-
-        # Use the largest region assuming it's the shoe
-        largest = max(props, key=lambda r: r.area)
-        minr, minc, maxr, maxc = largest.bbox
-        height = maxr - minr
-        width = maxc - minc
-        ratio = height / width
-
-        if ratio > 1.4:
-            return "high-top"
-        elif ratio > 1.0:
-            return "mid-top"
-        return "low-top"
+        return classify_height(extract_shape_features(rgba_array))
     except Exception:
         return "unknown"
 
 
-
 def detect_design(rgba_array: np.ndarray) -> str:
-    """Detect patterns using edge analysis"""
+    """Detect patterns using edge analysis (see shape_features)"""
     try:
-        gray = cv2.cvtColor(rgba_array[:, :, :3], cv2.COLOR_RGB2GRAY)
-
-        # Edge detection
-        edges = cv2.Canny(gray, 50, 150)
-
-        # Detect lines
-        lines = cv2.HoughLinesP(
-            edges,
-            rho=1,
-            theta=np.pi / 180,
-            threshold=30,
-            minLineLength=20,
-            maxLineGap=10
-        )
-
-        if lines is not None and len(lines) > 2:
-            return "striped"
-
-        # Check for other patterns
-        contours, _ = cv2.findContours(
-            edges,
-            cv2.RETR_EXTERNAL,
-            cv2.CHAIN_APPROX_SIMPLE
-        )
-
-        if len(contours) > 5:
-            return "patterned"
-
-        return "solid"
+        return classify_design(extract_shape_features(rgba_array))
     except Exception:
         return "unknown"
 
 
+def analyse_shape(rgba_array: np.ndarray) -> Tuple[str, str]:
+    """Height and design from one shared pass over the crop"""
+    try:
+        features = extract_shape_features(rgba_array)
+    except Exception:
+        return "unknown", "unknown"
+
+    try:
+        height = classify_height(features)
+    except Exception:
+        height = "unknown"
+    try:
+        design = classify_design(features)
+    except Exception:
+        design = "unknown"
+    return height, design
+
+
 def rgb_to_name(rgb: np.ndarray) -> str:
-    """Enhanced color naming with better thresholds"""
-    r, g, b = rgb
-    h, s, v = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
-    h = h * 360
-
-    if v < 0.15: return "black"
-    if v > 0.9 and s < 0.1: return "white"
-    if s < 0.2: return "gray" if v < 0.7 else "off-white"
-
-    if h < 15 or h >= 345:
-        return "red"
-    elif 15 <= h < 40:
-        return "orange" if s > 0.5 else "brown"
-    elif 40 <= h < 65:
-        return "yellow"
-    elif 65 <= h < 160:
-        return "green"
-    elif 160 <= h < 200:
-        return "teal"
-    elif 200 <= h < 250:
-        return "blue"
-    elif 250 <= h < 290:
-        return "purple"
-    elif 290 <= h < 345:
-        return "pink"
-
-    return "neutral"
+    """Enhanced color naming with better thresholds (see color_names.name_rgb_pixels for arrays)"""
+    return str(name_rgb_pixels(np.asarray(rgb).reshape(1, 3))[0])
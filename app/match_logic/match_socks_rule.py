@@ -1,15 +1,22 @@
 import json
 import logging
 from typing import Dict, List, Optional
-from fuzzywuzzy import fuzz
 from dataclasses import dataclass
 from datetime import datetime
 import os
+import threading
+import time
+from app.config.config import STYLE_CONFIG_RELOAD_INTERVAL
+from app.metrics import timed
+from .rule_index import CompiledRules
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG_PATH = os.path.abspath(os.path.join(script_dir, '..', '..', 'config', 'style_configure.json'))
+
 @dataclass
 class AttributeWithConfidence:
     label: str
@@ -26,16 +33,29 @@ class ShoeAttributes:
     sub_category: Optional[AttributeWithConfidence] = None
 
 class StyleMatcher:
-    def __init__(self, config_path: str = '../config/style_config.json'):
-        self.config = self._load_config(config_path)
+    def __init__(self, config_path: Optional[str] = None, reload_interval: float = STYLE_CONFIG_RELOAD_INTERVAL):
+        self.config_path = config_path or DEFAULT_CONFIG_PATH
+        self.reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._config_mtime = self._get_mtime()
+        self.rules = CompiledRules(self._load_config(self.config_path))
+
+    @property
+    def config(self) -> Dict:
+        return self.rules.config
+
+    def _get_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            return None
 
     def _load_config(self, path: str) -> Dict:
         try:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            config_path = os.path.abspath(os.path.join(script_dir, '..', '..', 'config', 'style_configure.json'))
-            if not os.path.exists(config_path):
-                raise FileNotFoundError(f"Configuration file not found: {config_path}")
-            with open(config_path, 'r', encoding='utf-8') as f:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Configuration file not found: {path}")
+            with open(path, 'r', encoding='utf-8') as f:
                 config = json.load(f)
 
             required_sections = ["shoe_rules", "color_rules", "fallback"]
@@ -48,6 +68,32 @@ class StyleMatcher:
             logger.error(f"Failed to load config: {e}")
             raise
 
+    def reload(self, force: bool = False) -> bool:
+        """
+        Re-parse and compile the config if its mtime changed (or always, with
+        force) and swap it in with a single assignment. A broken file keeps the current
+        config in place. Returns True when a new config was installed.
+        """
+        with self._reload_lock:
+            self._last_check = time.monotonic()
+            mtime = self._get_mtime()
+            if not force and mtime == self._config_mtime:
+                return False
+            try:
+                rules = CompiledRules(self._load_config(self.config_path))
+            except Exception as e:
+                logger.error(f"Keeping the previous style config: {e}")
+                return False
+            self.rules = rules
+            self._config_mtime = mtime
+            logger.info(f"Style config reloaded from {self.config_path}")
+            return True
+
+    def maybe_reload(self):
+        """Cheap per-request hook: stat the config at most once per reload_interval."""
+        if time.monotonic() - self._last_check >= self.reload_interval:
+            self.reload()
+
     def _get_current_season(self) -> str:
         month = datetime.now().month
         if month in [12, 1, 2]:
@@ -58,75 +104,24 @@ class StyleMatcher:
             return "summer"
         return "fall"
 
-    def _match_color_rules(self, attributes: ShoeAttributes) -> Optional[Dict]:
-        best_match = None
-        highest_score = 0
-        for rule in self.config.get("color_rules", []):
-            primary_score = fuzz.ratio(rule["primary"].lower(), attributes.colors[0].lower() if attributes.colors else "")
-            if primary_score < 70:
-                continue
-            secondary_score = 0
-            if "secondary" in rule and len(attributes.colors) > 1:
-                secondary_score = max(
-                    fuzz.ratio(s.lower(), attributes.colors[1].lower()) for s in rule["secondary"]
-                )
-            total_score = (primary_score * 0.7 + secondary_score * 0.3) + rule.get("priority", 0)
-            if total_score > highest_score:
-                highest_score = total_score
-                best_match = rule
-        return best_match
-
-    def _match_shoe_rules(self, attributes: ShoeAttributes) -> Optional[Dict]:
-        best_match = None
-
-        for rule in self.config.get("shoe_rules", []):
-            if attributes.category and attributes.sub_category:
-                # Direct match for category
-                if rule.get("category", "").lower() == attributes.category.label.lower():
-
-                    # Match sub_category: support list of subcategories in rule
-                    rule_subcategories = rule.get("subcategories", [])
-                    if isinstance(rule_subcategories, list):
-                        subcategory_match = any(
-                            sub.lower() == attributes.sub_category.label.lower()
-                            for sub in rule_subcategories
-                        )
-                    else:
-                        subcategory_match = rule_subcategories.lower() == attributes.sub_category.label.lower()
-
-                    if subcategory_match:
-                        # Gender handling (list or string in rules)
-                        rule_gender = rule.get("gender", "unisex")
-                        attribute_gender = attributes.gender.lower()
-
-                        if isinstance(rule_gender, list):
-                            rule_gender_list = [g.lower() for g in rule_gender]
-                            selected_gender = attribute_gender if attribute_gender in rule_gender_list else "unisex"
-                        else:
-                            rule_gender_value = rule_gender.lower()
-                            selected_gender = attribute_gender if attribute_gender == rule_gender_value else "unisex"
-
-                        best_match = dict(rule)  # Make a copy to avoid modifying the original rule
-                        best_match["selected_gender"] = selected_gender
-                        break  # Found a match, exit
-
-        return best_match
-
-    def _match_design_rules(self, attributes: ShoeAttributes) -> Optional[Dict]:
-        for rule in self.config.get("design_rules", []):
-            if fuzz.ratio(rule["design"].lower(), attributes.design.lower()) > 80:
-                return rule
-        return None
-
-    def _check_special_combos(self, attributes: ShoeAttributes) -> Optional[Dict]:
-        for combo in self.config.get("special_combinations", []):
-            if (self._color_match(combo["colors"][0], attributes.colors[0]) and
-                (len(combo["colors"]) == 1 or self._color_match(combo["colors"][1], attributes.colors[1] if len(attributes.colors) > 1 else ""))):
-                return combo["recommendations"]
-        return None
+    def _match_color_rules(self, attributes: ShoeAttributes, rules: Optional[CompiledRules] = None) -> Optional[Dict]:
+        return (rules or self.rules).color_rule(attributes.colors)
+
+    def _match_shoe_rules(self, attributes: ShoeAttributes, rules: Optional[CompiledRules] = None) -> Optional[Dict]:
+        if not (attributes.category and attributes.sub_category):
+            return None
+        return (rules or self.rules).shoe_rule(
+            attributes.category.label, attributes.sub_category.label, attributes.gender
+        )
+
+    def _match_design_rules(self, attributes: ShoeAttributes, rules: Optional[CompiledRules] = None) -> Optional[Dict]:
+        return (rules or self.rules).design_rule(attributes.design)
+
+    def _check_special_combos(self, attributes: ShoeAttributes, rules: Optional[CompiledRules] = None) -> Optional[Dict]:
+        return (rules or self.rules).special_combo(attributes.colors)
 
     def _color_match(self, expected: str, actual: str) -> bool:
-        return fuzz.ratio(expected.lower(), actual.lower()) > 70
+        return self.rules.similarity(expected.lower(), actual.lower()) > 70
 
     def _calculate_confidence(self, *matches: Optional[Dict]) -> float:
         weights = { 'shoe_match': 0.4, 'color_match': 0.4, 'design_match': 0.2 }
@@ -143,8 +138,8 @@ class StyleMatcher:
             total_weight += weights['design_match']
         return round(score / total_weight, 2) if total_weight > 0 else 0.0
 
-    def _apply_fallbacks(self, recommendations: Dict) -> Dict:
-        fallback = self.config["fallback"]
+    def _apply_fallbacks(self, recommendations: Dict, rules: Optional[CompiledRules] = None) -> Dict:
+        fallback = (rules or self.rules).config["fallback"]
         return {
             "sock_types": recommendations.get("sock_types") or fallback.get("sock_types", []),
             "sock_colors": recommendations.get("sock_colors") or fallback.get("colors", []),
@@ -170,18 +165,22 @@ class StyleMatcher:
         return (f"Suggested socks are {', '.join(style_parts)} — ideal for the {attributes.season} season."
                 if style_parts else "No direct style rules matched — fallback suggestions provided for versatility.")
 
+    @timed("style_match")
     def match(self, attributes: ShoeAttributes) -> Dict:
+        self.maybe_reload()
+        # One compiled snapshot per call, so a concurrent reload cannot mix two configs
+        rules = self.rules
         try:
             if not attributes.season:
                 attributes.season = self._get_current_season()
             match_details = {"shoe_rule_matched": False, "color_rule_matched": False, "design_rule_matched": False, "special_combo_matched": False, "rules_applied": []}
-            special_match = self._check_special_combos(attributes)
+            special_match = self._check_special_combos(attributes, rules)
             if special_match:
                 match_details.update({"special_combo_matched": True, "rules_applied": ["special_combination"]})
                 return {**special_match, "match_type": "special_combo", "confidence": 0.85, "match_details": match_details}
-            shoe_match = self._match_shoe_rules(attributes)
-            color_match = self._match_color_rules(attributes)
-            design_match = self._match_design_rules(attributes)
+            shoe_match = self._match_shoe_rules(attributes, rules)
+            color_match = self._match_color_rules(attributes, rules)
+            design_match = self._match_design_rules(attributes, rules)
             if shoe_match:
                 match_details.update({"shoe_rule_matched": True, "rules_applied": match_details["rules_applied"] + ["shoe_rule"]})
             if color_match:
@@ -201,8 +200,8 @@ class StyleMatcher:
                 "confidence": confidence,
                 "match_details": match_details
             }
-            return self._apply_fallbacks(recommendations)
+            return self._apply_fallbacks(recommendations, rules)
         except Exception as e:
             logger.error(f"Matching failed: {e}")
-            fallback = self.config.get("fallback", {})
+            fallback = rules.config.get("fallback", {})
             return {"sock_types": fallback.get("sock_types", []), "sock_colors": fallback.get("colors", []), "patterns": fallback.get("patterns", []), "materials": [fallback.get("material", "default_material")], "match_type": "fallback", "confidence": 0.0, "error": str(e), "match_details": {"fallback_used": True, "reason": str(e)}}
@@ -1,9 +1,17 @@
 
 import logging
-from typing import Optional, Dict
+import threading
+from typing import Callable, Optional, Dict, Tuple, Union
 
-from .image_preprocessing import detect_and_process_shoe, extract_shoe_attributes
+import numpy as np
+
+from app.config.config import (RESULT_CACHE_ENABLED, RESULT_CACHE_MODE, RESULT_CACHE_MAX_ENTRIES,
+                               RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_MAX_HAMMING, MULTI_SHOE_MAX_SHOES)
+from .image_preprocessing import (ImageSource, StageCallback, detect_and_process_shoe_image, detect_shoes,
+                                  remove_shoe_background, extract_shoe_attributes, load_image, decode_shoe_crop)
 from .match_socks_rule import StyleMatcher, ShoeAttributes, AttributeWithConfidence
+from .multi_shoe import analyse_shoes
+from .result_cache import ResultCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -11,6 +19,13 @@ logger = logging.getLogger(__name__)
 
 # Define the data classes for attributes and shoe
 
+# Shared across recommenders so repeated uploads skip the whole pipeline
+result_cache = ResultCache(
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    ttl_seconds=RESULT_CACHE_TTL_SECONDS,
+    mode=RESULT_CACHE_MODE,
+    max_hamming=RESULT_CACHE_MAX_HAMMING
+) if RESULT_CACHE_ENABLED else None
 
 
 def safe_label(predicted: Dict, attr: str) -> Optional[AttributeWithConfidence]:
@@ -86,99 +101,273 @@ class SockRecommender:
     #         return eval(content)
 
     def match_socks(self, image_path: str, gender: str = "unisex") -> Dict:
+        return self.match_socks_image(image_path, gender)
+
+    def cache_lookup(self, image: ImageSource, gender: str = "unisex", key_space: Optional[str] = None,
+                     exact: bool = False) -> Tuple[ImageSource, Optional[Tuple], Optional[Dict]]:
+        """
+        (image, cache key, cached result) for an upload. In perceptual mode the image
+        comes back decoded so the pipeline does not decode it again. key_space keeps
+        differently shaped results apart; the key is None when the cache is off.
+        """
+        if result_cache is None:
+            return image, None, None
+        try:
+            if result_cache.mode == "perceptual" and not exact:
+                image = load_image(image)
+            cache_key = result_cache.key_for(image, f"{gender}|{key_space}" if key_space else gender, exact=exact)
+            return image, cache_key, result_cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f"Result cache lookup skipped: {e}")
+            return image, None, None
+
+    def cache_store(self, cache_key: Optional[Tuple], result: Dict):
+        """Store a result under a key from cache_lookup; error responses are never cached."""
+        if cache_key is not None and result.get("error") is None:
+            result_cache.put(cache_key, result)
+
+    def _cached(self, image: ImageSource, gender: str, compute: Callable[[ImageSource], Dict],
+                key_space: Optional[str] = None, exact: bool = False) -> Dict:
+        """compute(image) through the result cache"""
+        image, cache_key, cached = self.cache_lookup(image, gender, key_space, exact)
+        if cached is not None:
+            return cached
+        result = compute(image)
+        self.cache_store(cache_key, result)
+        return result
+
+    def match_socks_image(self, image: ImageSource, gender: str = "unisex") -> Dict:
+        """Same as match_socks, but accepts encoded image bytes or a decoded BGR array."""
+        return self._cached(image, gender, lambda img: self._match_socks_uncached(img, gender))
+
+    def match_socks_stream(self, image: ImageSource, on_stage: StageCallback, gender: str = "unisex") -> Dict:
+        """
+        Same as match_socks_image, reporting each stage to on_stage as it completes:
+        "detection" (boxes), "attributes" (colors/height/design), "model_properties",
+        then "result" with the full match_socks response, which is also returned.
+        A cached result is reported as "result" alone.
+        """
+        result = self._cached(image, gender, lambda img: self._match_socks_stages(img, on_stage, gender))
+        on_stage("result", result)
+        return result
+
+    def _match_socks_stages(self, image: ImageSource, on_stage: StageCallback, gender: str) -> Dict:
+        try:
+            image = load_image(image)
+            detections = detect_shoes([image])[0]
+            on_stage("detection", {
+                "boxes": [list(d.box) for d in detections],
+                "image_size": [image.shape[1], image.shape[0]]
+            })
+            shoe_image = remove_shoe_background(image, detections)
+            attributes = extract_shoe_attributes(shoe_image, on_stage=on_stage)
+            result = self.recommend(attributes, gender)
+
+        except Exception as e:
+            result = self.error_response(e, gender)
+        return result
+
+    def match_socks_multi(self, image: ImageSource, gender: str = "unisex") -> Dict:
+        """
+        Multi-shoe variant of match_socks_image: every confident detection is analysed.
+        Returns the usual single-shoe response (for the first shoe that could be
+        processed, as match_socks picks it) plus "shoes": one entry per detection
+        with its box, confidence and match_socks-shaped result. Detections that
+        were merged with an earlier one share its result and name it in "shared_with".
+        """
+        # Multi-shoe results have their own shape, so they get their own key space
+        return self._cached(image, gender, lambda img: self._match_socks_multi_uncached(img, gender),
+                            key_space="multi")
+
+    def _match_socks_multi_uncached(self, image: ImageSource, gender: str) -> Dict:
         try:
-            shoe_image = detect_and_process_shoe(image_path)
-            attributes = extract_shoe_attributes(shoe_image)
-
-            if attributes.get("error"):
-                raise ValueError(attributes["error"])
-
-            predicted = attributes.get("model_properties", {})
-            ai_attributes = {
-                "category": safe_label(predicted, 'Category'),
-                "sub_category": safe_label(predicted, 'SubCategory'),
-                "gender_predicted": safe_label(predicted, 'Gender'),
-                "material": safe_label(predicted, 'Material'),
-                "closure": safe_label(predicted, 'Closure'),
-                "toe_style": safe_label(predicted, 'ToeStyle'),
-                "heel_height": safe_label(predicted, 'HeelHeight'),
-                "insole": safe_label(predicted, 'Insole')
-            }
-
-            # Process colors
-            colors = [c.lower() for c in attributes.get("colors", [])]
-
-            # Build the ShoeAttributes object
-            shoe_attrs = ShoeAttributes(
-                height=attributes.get("height", "low").lower(),
-                colors=colors,
-                design=attributes.get("design", "solid").lower(),
-                gender=ai_attributes["gender_predicted"].label.lower() if ai_attributes[
-                    "gender_predicted"] else gender.lower(),
-                category=ai_attributes["category"],
-                sub_category=ai_attributes["sub_category"]
-            )
-
-            # Match socks
-            recommendations = self.matcher.match(shoe_attrs)
-
-            primary_color = colors[0] if colors else "neutral"
-            accent_color = colors[1] if len(colors) > 1 else None
-            secondary_color = colors[2] if len(colors) > 2 else None
-
-            base_response = {
-                "shoe_analysis": {
-                    "category": shoe_attrs.category.label if shoe_attrs.category else "unknown",
-                    "sub_category": shoe_attrs.sub_category.label if shoe_attrs.sub_category else "unknown",
-                    "gender": shoe_attrs.gender,
-                    "height": shoe_attrs.height,
-                    "primary_color": primary_color,
-                    "accent_color": accent_color,
-                    "secondary_color": secondary_color,
-                    "design": shoe_attrs.design,
-                    "season": shoe_attrs.season
-                },
-                "recommendations": {
-                    "types": recommendations["sock_types"],
-                    "colors": recommendations["sock_colors"],
-                    "patterns": recommendations["patterns"],
-                    "materials": recommendations["materials"]
-                },
-                "metadata": {
-                    "match_type": recommendations["match_type"],
-                    "confidence": round(recommendations.get("confidence", 0), 2),
-                    "season": shoe_attrs.season,
-                    "match_details": recommendations.get("match_details", {}),
-                    "special_combo_match": recommendations.get("special_combo_match"),
-                    "fallback_used": recommendations.get("fallback_used", False)
-                },
-                "style_tip": recommendations.get("style_tip"),
-                "error": None
-            }
-
-            # Uncomment this block to enable GPT-based fine-tuning
-            # gpt_refinement = self.gpt_refine(base_response)
-            # base_response["recommendations"] = {
-            #     "types": gpt_refinement["refined_types"],
-            #     "colors": gpt_refinement["refined_colors"],
-            #     "patterns": gpt_refinement["refined_patterns"],
-            #     "materials": gpt_refinement["refined_materials"]
-            # }
-            # base_response["style_tip"] = gpt_refinement["style_tip"]
-
-            return base_response
+            image = load_image(image)
+            detections = detect_shoes([image])[0][:MULTI_SHOE_MAX_SHOES]
+            if not detections:
+                raise ValueError("❌ No shoes detected in the image.")
+
+            shoes, summary = [], None
+            for group in analyse_shoes(image, detections):
+                if group["attributes"] is None:
+                    result = self.error_response(ValueError("❌ No valid shoes were processed."), gender)
+                else:
+                    try:
+                        result = self.recommend(group["attributes"], gender)
+                    except Exception as e:
+                        result = self.error_response(e, gender)
+                if summary is None and result.get("error") is None:
+                    summary = result
+
+                representative = group["members"][0]
+                for index in group["members"]:
+                    detection = detections[index]
+                    shoes.append({
+                        "index": index,
+                        "box": list(detection.box),
+                        "confidence": round(detection.confidence, 3) if detection.confidence is not None else None,
+                        "shared_with": representative if index != representative else None,
+                        "result": result
+                    })
+
+            if summary is None:
+                raise ValueError("❌ No valid shoes were processed.")
+            response = {**summary, "shoes": sorted(shoes, key=lambda s: s["index"])}
 
         except Exception as e:
-            logger.error(f"Recommendation failed: {e}")
-            return {
-                "shoe_analysis": None,
-                "recommendations": self.matcher.config["fallback"],
-                "metadata": {
-                    "match_type": "error",
-                    "confidence": 0,
-                    "fallback_used": True
-                },
-                "style_tip": None,
-                "gender": gender,
-                "error": str(e)
-            }
+            return {**self.error_response(e, gender), "shoes": []}
+        return response
+
+    def match_socks_crop(self, crop: Union[bytes, np.ndarray], gender: str = "unisex") -> Dict:
+        """
+        match_socks for a shoe that is already cropped with its background removed
+        (transparent PNG bytes or an RGBA array): YOLO and rembg are skipped and the
+        crop goes straight into extract_shoe_attributes.
+        """
+        # The same bytes sent to /match would go through detection, so crops get their own key
+        # space; they are keyed on their exact content because the perceptual hash ignores alpha
+        return self._cached(crop, gender, lambda c: self._match_socks_crop_uncached(c, gender),
+                            key_space="crop", exact=True)
+
+    def _match_socks_crop_uncached(self, crop: Union[bytes, np.ndarray], gender: str) -> Dict:
+        try:
+            rgba = crop if isinstance(crop, np.ndarray) else decode_shoe_crop(crop)
+            return self.analyse_crop(rgba, gender)
+        except Exception as e:
+            return self.error_response(e, gender)
+
+    def match_attributes(self, shoe_attrs: ShoeAttributes) -> Dict:
+        """match_socks for attributes the caller already knows: only the style rules run."""
+        try:
+            return self.respond(shoe_attrs)
+        except Exception as e:
+            return self.error_response(e, shoe_attrs.gender)
+
+    def _match_socks_uncached(self, image: ImageSource, gender: str) -> Dict:
+        try:
+            shoe_image = detect_and_process_shoe_image(image)
+            return self.analyse_crop(shoe_image, gender)
+
+        except Exception as e:
+            return self.error_response(e, gender)
+
+    def analyse_crop(self, rgba: np.ndarray, gender: str = "unisex") -> Dict:
+        """
+        recommend(extract_shoe_attributes(rgba)) for one background-removed crop.
+        With the embedding cache on, the model task reuses the stored predictions of
+        a near-duplicate shoe (see shoe_model_prediction.predict_model_properties).
+        """
+        return self.recommend(extract_shoe_attributes(rgba), gender)
+
+    def recommend(self, attributes: Dict, gender: str = "unisex") -> Dict:
+        """Build the match_socks response from the output of extract_shoe_attributes"""
+        if attributes.get("error"):
+            raise ValueError(attributes["error"])
+
+        predicted = attributes.get("model_properties", {})
+        ai_attributes = {
+            "category": safe_label(predicted, 'Category'),
+            "sub_category": safe_label(predicted, 'SubCategory'),
+            "gender_predicted": safe_label(predicted, 'Gender'),
+            "material": safe_label(predicted, 'Material'),
+            "closure": safe_label(predicted, 'Closure'),
+            "toe_style": safe_label(predicted, 'ToeStyle'),
+            "heel_height": safe_label(predicted, 'HeelHeight'),
+            "insole": safe_label(predicted, 'Insole')
+        }
+
+        # Process colors
+        colors = [c.lower() for c in attributes.get("colors", [])]
+
+        # Build the ShoeAttributes object
+        shoe_attrs = ShoeAttributes(
+            height=attributes.get("height", "low").lower(),
+            colors=colors,
+            design=attributes.get("design", "solid").lower(),
+            gender=ai_attributes["gender_predicted"].label.lower() if ai_attributes[
+                "gender_predicted"] else gender.lower(),
+            category=ai_attributes["category"],
+            sub_category=ai_attributes["sub_category"]
+        )
+        return self.respond(shoe_attrs)
+
+    def respond(self, shoe_attrs: ShoeAttributes) -> Dict:
+        """Run the style rules for shoe_attrs and build the match_socks response"""
+        # Match socks
+        recommendations = self.matcher.match(shoe_attrs)
+
+        colors = shoe_attrs.colors
+        primary_color = colors[0] if colors else "neutral"
+        accent_color = colors[1] if len(colors) > 1 else None
+        secondary_color = colors[2] if len(colors) > 2 else None
+
+        base_response = {
+            "shoe_analysis": {
+                "category": shoe_attrs.category.label if shoe_attrs.category else "unknown",
+                "sub_category": shoe_attrs.sub_category.label if shoe_attrs.sub_category else "unknown",
+                "gender": shoe_attrs.gender,
+                "height": shoe_attrs.height,
+                "primary_color": primary_color,
+                "accent_color": accent_color,
+                "secondary_color": secondary_color,
+                "design": shoe_attrs.design,
+                "season": shoe_attrs.season
+            },
+            "recommendations": {
+                "types": recommendations["sock_types"],
+                "colors": recommendations["sock_colors"],
+                "patterns": recommendations["patterns"],
+                "materials": recommendations["materials"]
+            },
+            "metadata": {
+                "match_type": recommendations["match_type"],
+                "confidence": round(recommendations.get("confidence", 0), 2),
+                "season": shoe_attrs.season,
+                "match_details": recommendations.get("match_details", {}),
+                "special_combo_match": recommendations.get("special_combo_match"),
+                "fallback_used": recommendations.get("fallback_used", False)
+            },
+            "style_tip": recommendations.get("style_tip"),
+            "error": None
+        }
+
+        # Uncomment this block to enable GPT-based fine-tuning
+        # gpt_refinement = self.gpt_refine(base_response)
+        # base_response["recommendations"] = {
+        #     "types": gpt_refinement["refined_types"],
+        #     "colors": gpt_refinement["refined_colors"],
+        #     "patterns": gpt_refinement["refined_patterns"],
+        #     "materials": gpt_refinement["refined_materials"]
+        # }
+        # base_response["style_tip"] = gpt_refinement["style_tip"]
+
+        return base_response
+
+    def error_response(self, e: Exception, gender: str = "unisex") -> Dict:
+        """The fallback response match_socks returns when any stage fails"""
+        logger.error(f"Recommendation failed: {e}")
+        return {
+            "shoe_analysis": None,
+            "recommendations": self.matcher.config["fallback"],
+            "metadata": {
+                "match_type": "error",
+                "confidence": 0,
+                "fallback_used": True
+            },
+            "style_tip": None,
+            "gender": gender,
+            "error": str(e)
+        }
+
+
+_recommender: Optional[SockRecommender] = None
+_recommender_lock = threading.Lock()
+
+
+def get_recommender() -> SockRecommender:
+    """Process-wide SockRecommender; its StyleMatcher hot-reloads the style config."""
+    global _recommender
+    if _recommender is None:
+        with _recommender_lock:
+            if _recommender is None:
+                _recommender = SockRecommender()
+    return _recommender
@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import psutil
+from app.config.config import MODEL_WARMUP
+
+logger = logging.getLogger(__name__)
+
+_process = psutil.Process(os.getpid())
+
+
+def _reset_process():
+    # A Process made before fork() keeps measuring the parent's pid
+    global _process
+    _process = psutil.Process(os.getpid())
+
+
+os.register_at_fork(after_in_child=_reset_process)
+
+
+def rss_mb() -> float:
+    return _process.memory_info().rss / 1024 / 1024
+
+
+class _Entry:
+    def __init__(self, name: str, loader: Callable[[], Any], warm_up: Optional[Callable[[Any], None]], preload: bool):
+        self.name = name
+        self.loader = loader
+        self.warm_up = warm_up
+        self.preload = preload
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.state = "pending"
+        self.value = None
+        self.error = None
+        self.warm_up_error = None
+        self.load_s = None
+        self.warm_up_s = None
+        self.rss_after_mb = None
+        self.rss_delta_mb = None
+
+
+class ModelRegistry:
+    """
+    Named, lazily loaded models. start() loads and warms every registered
+    model in parallel background threads; get() returns a model, loading it
+    in the calling thread if nobody has started it yet, or waiting for the
+    background load otherwise. Models registered with preload=False are only
+    loaded on first use and do not count towards readiness until then.
+    """
+
+    def __init__(self, warm_up: bool = True):
+        self.warm_up = warm_up
+        self._entries: Dict[str, _Entry] = {}
+        self._started_at = None
+
+    def register(self, name: str, loader: Callable[[], Any], warm_up: Optional[Callable[[Any], None]] = None,
+                 preload: bool = True):
+        if name in self._entries:
+            raise ValueError(f"Model '{name}' is already registered")
+        self._entries[name] = _Entry(name, loader, warm_up, preload)
+
+    def _load(self, entry: _Entry, warm: bool = True):
+        with entry.lock:
+            if entry.state != "pending":
+                return
+            entry.state = "loading"
+
+        rss_before = rss_mb()
+        try:
+            started = time.perf_counter()
+            entry.value = entry.loader()
+            entry.load_s = time.perf_counter() - started
+            entry.state = "loaded"
+
+            if warm:
+                self._run_warm_up(entry)
+            elif not self.warm_up or entry.warm_up is None:
+                entry.state = "ready"
+        except Exception as e:
+            entry.error = str(e)
+            entry.state = "failed"
+            logger.exception(f"Failed to load model '{entry.name}': {e}")
+        finally:
+            # Loads overlap, so the delta is only indicative of this model's footprint
+            entry.rss_after_mb = rss_mb()
+            entry.rss_delta_mb = entry.rss_after_mb - rss_before
+            entry.done.set()
+
+        if entry.state in ("loaded", "ready"):
+            print(f"[MODEL MEMORY] {entry.name}: loaded in {entry.load_s:.2f}s"
+                  f"{f', warmed in {entry.warm_up_s:.2f}s' if entry.warm_up_s is not None else ''}; "
+                  f"process using {entry.rss_after_mb:.2f} MB (+{entry.rss_delta_mb:.2f} MB).")
+        self._report_ready()
+
+    def _run_warm_up(self, entry: _Entry):
+        # The model itself loaded, so a failed warm-up only costs the first request its latency
+        if self.warm_up and entry.warm_up is not None:
+            started = time.perf_counter()
+            try:
+                entry.warm_up(entry.value)
+                entry.warm_up_s = time.perf_counter() - started
+            except Exception as e:
+                entry.warm_up_error = str(e)
+                logger.exception(f"Failed to warm model '{entry.name}'; serving it cold: {e}")
+        entry.state = "ready"
+
+    def _warm(self, entry: _Entry):
+        """Warm a model that was loaded with warm=False (e.g. in a pre-fork parent)."""
+        with entry.lock:
+            if entry.state != "loaded":
+                return
+            entry.state = "warming"
+        self._run_warm_up(entry)
+        self._report_ready()
+
+    def _report_ready(self):
+        if self._started_at is not None and self.is_ready():
+            print(f"[READY] All models loaded in {time.perf_counter() - self._started_at:.2f}s; "
+                  f"process using {rss_mb():.2f} MB.")
+
+    def start(self, load_pending: bool = True):
+        """
+        Load and warm every registered model in parallel, without blocking.
+        Models already loaded with warm=False are always warmed (and so become
+        ready); load_pending=False leaves the rest to be loaded on first use.
+        """
+        self._started_at = self._started_at or time.perf_counter()
+        for entry in self._entries.values():
+            if entry.state == "pending" and entry.preload and load_pending:
+                threading.Thread(target=self._load, args=(entry,), name=f"load-{entry.name}", daemon=True).start()
+            elif entry.state == "loaded":
+                threading.Thread(target=self._warm, args=(entry,), name=f"warm-{entry.name}", daemon=True).start()
+
+    def load(self, names: Iterable[str], warm: bool = True):
+        """Load the named models in the calling thread, one after another."""
+        for name in names:
+            self._load(self._entries[name], warm=warm)
+
+    def load_all(self, timeout: Optional[float] = None) -> bool:
+        """start() and block until every model is ready or failed."""
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for entry in self._entries.values():
+            if not entry.preload and entry.state == "pending":
+                continue
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            entry.done.wait(remaining)
+        # Models loaded earlier with warm=False are warmed by separate threads
+        while any(e.state == "warming" for e in self._entries.values()):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.05)
+        return self.is_ready()
+
+    def get(self, name: str, timeout: Optional[float] = None) -> Any:
+        entry = self._entries[name]
+        if entry.state == "pending":
+            self._load(entry)
+        if not entry.done.wait(timeout):
+            raise TimeoutError(f"Model '{name}' is still loading")
+        if entry.state == "failed":
+            raise RuntimeError(f"Model '{name}' failed to load: {entry.error}")
+        return entry.value
+
+    def is_ready(self) -> bool:
+        return all(entry.state == "ready" for entry in self._entries.values()
+                   if entry.preload or entry.state != "pending")
+
+    def status(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                "state": entry.state,
+                "preload": entry.preload,
+                "load_s": round(entry.load_s, 3) if entry.load_s is not None else None,
+                "warm_up_s": round(entry.warm_up_s, 3) if entry.warm_up_s is not None else None,
+                "rss_after_mb": round(entry.rss_after_mb, 2) if entry.rss_after_mb is not None else None,
+                "rss_delta_mb": round(entry.rss_delta_mb, 2) if entry.rss_delta_mb is not None else None,
+                "error": entry.error,
+                "warm_up_error": entry.warm_up_error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+# Process-wide registry; each model module registers its own loader at import
+registry = ModelRegistry(warm_up=MODEL_WARMUP)
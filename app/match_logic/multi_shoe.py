@@ -0,0 +1,125 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from app.config.config import MULTI_SHOE_MERGE_IOU, MULTI_SHOE_APPEARANCE_THRESHOLD
+from app.metrics import timed
+from app.thread_budget import budget
+from .image_preprocessing import Box, Detection, isolate_shoe, extract_shoe_attributes
+from .resolution import fit_within
+from .shoe_model_prediction import preprocess_crop, predict_batch
+
+logger = logging.getLogger(__name__)
+
+# Long-lived pool for per-shoe background removal and attribute extraction
+_pool = ThreadPoolExecutor(max_workers=max(1, budget.multi_shoe_workers), thread_name_prefix="multi-shoe")
+
+# Appearance is compared on small crops; a hue/saturation histogram ignores left/right mirroring
+_SIGNATURE_SIDE = 128
+_HIST_BINS = [30, 32]
+_MIN_AREA_RATIO = 0.5
+
+
+def box_iou(a: Box, b: Box) -> float:
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def box_area(box: Box) -> int:
+    return max(0, box[2] - box[0]) * max(0, box[3] - box[1])
+
+
+def appearance_signature(image: np.ndarray, box: Box) -> Optional[np.ndarray]:
+    """Normalised hue/saturation histogram of a detection's crop, None for an empty box"""
+    x1, y1, x2, y2 = box
+    crop = image[y1:y2, x1:x2]
+    if crop.size == 0:
+        return None
+    small, _ = fit_within(crop, _SIGNATURE_SIDE)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, _HIST_BINS, [0, 180, 0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+
+def group_detections(image: np.ndarray, detections: Sequence[Detection],
+                     merge_iou: float = MULTI_SHOE_MERGE_IOU,
+                     appearance_threshold: float = MULTI_SHOE_APPEARANCE_THRESHOLD) -> List[List[int]]:
+    """
+    Greedily group detections (in YOLO's confidence order) that need only one analysis:
+    a detection joins the first group whose representative overlaps it by merge_iou,
+    or is of similar size and looks alike (histogram correlation >= appearance_threshold).
+    Each group is a list of detection indices; the first is the representative.
+    """
+    groups: List[List[int]] = []
+    signatures = [None] * len(detections)
+    check_appearance = appearance_threshold <= 1.0
+    if check_appearance:
+        signatures = [appearance_signature(image, d.box) for d in detections]
+
+    for i, detection in enumerate(detections):
+        for group in groups:
+            rep = detections[group[0]]
+            if box_iou(rep.box, detection.box) >= merge_iou:
+                group.append(i)
+                break
+            if check_appearance and signatures[i] is not None and signatures[group[0]] is not None:
+                areas = sorted((box_area(rep.box), box_area(detection.box)))
+                similar_size = areas[1] > 0 and areas[0] / areas[1] >= _MIN_AREA_RATIO
+                if similar_size and cv2.compareHist(signatures[group[0]], signatures[i],
+                                                    cv2.HISTCMP_CORREL) >= appearance_threshold:
+                    group.append(i)
+                    break
+        else:
+            groups.append([i])
+    return groups
+
+
+def _isolate_group(image: np.ndarray, detections: Sequence[Detection], group: List[int]) -> Optional[np.ndarray]:
+    """First member crop with visible pixels, trying the group in order like remove_shoe_background"""
+    for index in group:
+        rgba = isolate_shoe(image, detections[index])
+        if rgba is not None:
+            return rgba
+    return None
+
+
+def _predict_all(rgbas: List[np.ndarray]) -> List[Dict]:
+    """One forward pass over every shoe; empty predictions on failure, like predict_model_properties"""
+    try:
+        return predict_batch([preprocess_crop(rgba) for rgba in rgbas])
+    except Exception as e:
+        print(f"Model prediction error: {e}")
+        return [{} for _ in rgbas]
+
+
+@timed("multi_shoe")
+def analyse_shoes(image: np.ndarray, detections: Sequence[Detection], num_colors: int = 3) -> List[Dict]:
+    """
+    Analyse every group of detections once. Background removal runs concurrently
+    per group (the first member with visible pixels is analysed), the attribute model then runs once over all
+    of them, and colours/height/design are extracted per shoe in parallel.
+    Returns one {"members": [...], "attributes": {...} or None} per group.
+    """
+    groups = group_detections(image, detections)
+    rgbas = list(_pool.map(lambda g: _isolate_group(image, detections, g), groups))
+    valid = [i for i, rgba in enumerate(rgbas) if rgba is not None]
+
+    # The batched forward pass runs first, in the calling thread: the per-shoe model tasks
+    # on the shared inference pool then return at once instead of holding its workers
+    predicted = _predict_all([rgbas[i] for i in valid]) if valid else []
+    futures = {
+        i: _pool.submit(extract_shoe_attributes, rgbas[i], num_colors, None,
+                        lambda _, slot=slot: predicted[slot])
+        for slot, i in enumerate(valid)
+    }
+
+    return [
+        {"members": group, "attributes": futures[i].result() if i in futures else None}
+        for i, group in enumerate(groups)
+    ]
@@ -0,0 +1,89 @@
+import logging
+import math
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from app.config.config import (RESOLUTION_MODE, DETECT_MAX_SIDE, REMBG_MAX_SIDE, COLORS_MAX_SIDE,
+                               SHAPE_MAX_SIDE)
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION_MODES = ("capped", "full")
+
+# Longest side, in pixels, that each stage works on; 0 means the stage sees the full resolution
+STAGE_MAX_SIDE = {
+    "detect": DETECT_MAX_SIDE,
+    "rembg": REMBG_MAX_SIDE,
+    "colors": COLORS_MAX_SIDE,
+    "shape": SHAPE_MAX_SIDE,
+}
+
+if RESOLUTION_MODE not in RESOLUTION_MODES:
+    logger.warning(f"Unknown resolution mode '{RESOLUTION_MODE}'; using 'capped'. Use one of {RESOLUTION_MODES}.")
+
+
+def max_side(stage: str) -> int:
+    if RESOLUTION_MODE == "full":
+        return 0
+    return max(0, STAGE_MAX_SIDE.get(stage, 0))
+
+
+def fit_within(image: np.ndarray, limit: int) -> Tuple[np.ndarray, float]:
+    """
+    Downscale so the longest side is at most limit (never upscales).
+    Returns (image, scale) with scale = new size / original size.
+    RGBA images keep a hard-edged alpha so the shoe mask does not grow a blended rim.
+    """
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if limit <= 0 or longest <= limit:
+        return image, 1.0
+
+    scale = limit / longest
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    if image.ndim == 3 and image.shape[2] == 4:
+        return _fit_rgba(image, size), scale
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def _fit_rgba(image: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """
+    INTER_AREA over the opaque pixels only. Transparent pixels are black in rembg
+    output, so the colour is premultiplied by alpha before averaging and divided
+    by the averaged alpha afterwards; the alpha itself is resized with NEAREST.
+    """
+    alpha = image[:, :, 3:].astype(np.float32) / 255.0
+    premultiplied = np.concatenate([image[:, :, :3].astype(np.float32) * alpha, alpha], axis=2)
+    small = cv2.resize(premultiplied, size, interpolation=cv2.INTER_AREA)
+    coverage = small[:, :, 3:]
+    rgb = np.divide(small[:, :, :3], coverage, out=np.zeros_like(small[:, :, :3]), where=coverage > 0)
+
+    resized = np.empty((size[1], size[0], 4), dtype=np.uint8)
+    resized[:, :, :3] = np.clip(np.rint(rgb), 0, 255)
+    resized[:, :, 3] = cv2.resize(image[:, :, 3], size, interpolation=cv2.INTER_NEAREST)
+    return resized
+
+
+def for_stage(image: np.ndarray, stage: str) -> np.ndarray:
+    """The copy of image a stage should work on under the current resolution policy"""
+    return fit_within(image, max_side(stage))[0]
+
+
+def boxes_to_original(boxes: Sequence[Tuple[int, int, int, int]], scale: float,
+                      shape: Tuple[int, ...]) -> List[Tuple[int, int, int, int]]:
+    """Map (x1, y1, x2, y2) boxes found on a copy resized by scale back onto the original image"""
+    if scale == 1.0:
+        return [tuple(map(int, box)) for box in boxes]
+    height, width = shape[:2]
+    mapped = []
+    for x1, y1, x2, y2 in boxes:
+        # Round outwards so the remapped box never cuts into the detection
+        mapped.append((
+            max(0, math.floor(x1 / scale)),
+            max(0, math.floor(y1 / scale)),
+            min(width, math.ceil(x2 / scale)),
+            min(height, math.ceil(y2 / scale)),
+        ))
+    return mapped
@@ -0,0 +1,153 @@
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .image_preprocessing import ImageSource, load_image
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Files whose change makes every cached result stale
+DEFAULT_WATCHED_PATHS = [
+    os.path.abspath(os.path.join(script_dir, "..", "..", "config", "style_configure.json")),
+    os.path.abspath(os.path.join(script_dir, "..", "..", "model", "model.pt")),
+    os.path.abspath(os.path.join(script_dir, "..", "..", "model", "best_shoe_model.pth")),
+]
+
+
+def dhash(image: np.ndarray, hash_size: int = 8) -> int:
+    """64-bit difference hash of a BGR image; stable across re-encodes and resizes."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of match results keyed by image content.
+    "exact" mode keys on a SHA-256 of the upload bytes; "perceptual" mode
+    keys on a dHash and also accepts stored hashes within max_hamming bits.
+    The whole cache is dropped when any watched file (style config, model
+    weights) changes.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600, mode: str = "exact",
+                 max_hamming: int = 4, watched_paths: Sequence[str] = DEFAULT_WATCHED_PATHS):
+        if mode not in ("exact", "perceptual"):
+            raise ValueError(f"Unknown cache mode '{mode}'. Use 'exact' or 'perceptual'.")
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self.mode = mode
+        self.max_hamming = max_hamming
+        self.watched_paths = list(watched_paths)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[float, Dict]]" = OrderedDict()
+        self._fingerprint = self._current_fingerprint()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def _current_fingerprint(self) -> Tuple:
+        fingerprint = []
+        for path in self.watched_paths:
+            try:
+                st = os.stat(path)
+                fingerprint.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                fingerprint.append((path, None, None))
+        return tuple(fingerprint)
+
+    def _check_fingerprint(self):
+        current = self._current_fingerprint()
+        if current != self._fingerprint:
+            self._entries.clear()
+            self._fingerprint = current
+            self._invalidations += 1
+
+    def key_for(self, image: ImageSource, gender: str = "unisex", exact: bool = False) -> Tuple:
+        """
+        Cache key for an upload; perceptual mode decodes the image to hash it.
+        exact=True keys on the content even in perceptual mode, for inputs the
+        BGR dHash cannot tell apart (e.g. crops that differ only in alpha).
+        """
+        if self.mode == "perceptual" and not exact:
+            return dhash(load_image(image)), gender
+
+        if isinstance(image, np.ndarray):
+            digest = hashlib.sha256(np.ascontiguousarray(image).tobytes())
+            digest.update(str(image.shape).encode())
+        elif isinstance(image, str):
+            with open(image, "rb") as f:
+                digest = hashlib.sha256(f.read())
+        else:
+            digest = hashlib.sha256(image)
+        return digest.hexdigest(), gender
+
+    def _find(self, key: Tuple) -> Optional[Tuple]:
+        if key in self._entries:
+            return key
+        if self.mode != "perceptual" or self.max_hamming <= 0:
+            return None
+        image_hash, gender = key
+        if not isinstance(image_hash, int):
+            return None  # exact keys only match themselves
+        best, best_distance = None, self.max_hamming + 1
+        for stored_hash, stored_gender in self._entries:
+            if stored_gender != gender or not isinstance(stored_hash, int):
+                continue
+            distance = (stored_hash ^ image_hash).bit_count()
+            if distance < best_distance:
+                best, best_distance = (stored_hash, stored_gender), distance
+        return best
+
+    def get(self, key: Tuple) -> Optional[Dict]:
+        with self._lock:
+            self._check_fingerprint()
+            found = self._find(key)
+            if found is not None:
+                stored_at, value = self._entries[found]
+                if time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(found)
+                    self._hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[found]
+            self._misses += 1
+            return None
+
+    def put(self, key: Tuple, value: Dict):
+        with self._lock:
+            self._check_fingerprint()
+            self._entries[key] = (time.monotonic(), copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._invalidations += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "mode": self.mode,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
@@ -0,0 +1,175 @@
+import logging
+import threading
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from fuzzywuzzy import fuzz
+
+logger = logging.getLogger(__name__)
+
+# Colour names produced by hsv_to_shoe_color / rgb_to_name (plus "unknown" on failure)
+SHOE_COLOR_VOCABULARY = [
+    "black", "white", "gray", "off-white", "red", "brown", "orange", "yellow",
+    "green", "teal", "blue", "purple", "pink", "neutral", "unknown",
+]
+
+# Designs produced by detect_design
+DESIGN_VOCABULARY = ["striped", "patterned", "solid", "unknown"]
+
+# Gender key used for "any gender not listed on the rule"
+ANY_GENDER = "*"
+
+# Upper bound on memoised lookups for values outside the precomputed vocabulary
+_MAX_MEMO_ENTRIES = 4096
+
+
+class CompiledRules:
+    """
+    Style config compiled into lookup tables at load time.
+    Every lookup returns exactly what the linear scans in StyleMatcher
+    returned, but costs a dict access instead of a pass over the rules:
+    - shoe rules: (category, subcategory, gender) -> rule with selected_gender
+    - colours: precomputed fuzz.ratio table over the colour vocabulary,
+      and the best colour rule / special combination per colour pair
+    - designs: design -> first design rule scoring above 80
+    Values outside the vocabulary are scored on demand and memoised.
+    """
+
+    def __init__(self, config: Dict):
+        self.config = config
+        self._memo_lock = threading.Lock()
+
+        self._color_rules = config.get("color_rules", [])
+        self._design_rules = config.get("design_rules", [])
+        self._special_combinations = config.get("special_combinations", [])
+
+        self._shoe_index = self._build_shoe_index(config.get("shoe_rules", []))
+
+        self.color_vocabulary = self._build_color_vocabulary()
+        self._similarity = {
+            (a, b): fuzz.ratio(a, b)
+            for a in self.color_vocabulary for b in self.color_vocabulary + [""]
+        }
+
+        primaries = self.color_vocabulary + [""]
+        secondaries = self.color_vocabulary + [None]
+        self._color_rule_table = {
+            (p, s): self._best_color_rule(p, s) for p in primaries for s in secondaries
+        }
+        self._special_table = {
+            (p, s): self._find_special_combo(p, s) for p in self.color_vocabulary for s in primaries
+        }
+
+        designs = set(DESIGN_VOCABULARY) | {r["design"].lower() for r in self._design_rules}
+        self._design_table = {d: self._find_design_rule(d) for d in designs}
+
+    # --- index construction -------------------------------------------------
+
+    @staticmethod
+    def _gender_set(rule: Dict) -> FrozenSet[str]:
+        rule_gender = rule.get("gender", "unisex")
+        if isinstance(rule_gender, list):
+            return frozenset(g.lower() for g in rule_gender)
+        return frozenset([rule_gender.lower()])
+
+    def _build_shoe_index(self, shoe_rules: List[Dict]) -> Dict[Tuple[str, str, str], Dict]:
+        index = {}
+        for rule in shoe_rules:
+            category = rule.get("category", "").lower()
+            rule_subcategories = rule.get("subcategories", [])
+            if not isinstance(rule_subcategories, list):
+                rule_subcategories = [rule_subcategories]
+            genders = self._gender_set(rule)
+
+            for sub in rule_subcategories:
+                key = (category, sub.lower())
+                # The first rule listing a (category, subcategory) wins, as in the linear scan
+                if (*key, ANY_GENDER) in index:
+                    continue
+                index[(*key, ANY_GENDER)] = {**rule, "selected_gender": "unisex"}
+                for gender in genders:
+                    index[(*key, gender)] = {**rule, "selected_gender": gender}
+        return index
+
+    def _build_color_vocabulary(self) -> List[str]:
+        names = list(SHOE_COLOR_VOCABULARY)
+        for rule in self._color_rules:
+            names.append(rule["primary"])
+            names.extend(rule.get("secondary", []))
+        for combo in self._special_combinations:
+            names.extend(combo["colors"])
+        return list(dict.fromkeys(n.lower() for n in names))
+
+    # --- reference implementations (used to fill the tables) ----------------
+
+    def _best_color_rule(self, primary: str, secondary: Optional[str]) -> Optional[Dict]:
+        best_match = None
+        highest_score = 0
+        for rule in self._color_rules:
+            primary_score = self.similarity(rule["primary"].lower(), primary)
+            if primary_score < 70:
+                continue
+            secondary_score = 0
+            if "secondary" in rule and secondary is not None:
+                secondary_score = max((self.similarity(s.lower(), secondary) for s in rule["secondary"]), default=0)
+            total_score = (primary_score * 0.7 + secondary_score * 0.3) + rule.get("priority", 0)
+            if total_score > highest_score:
+                highest_score = total_score
+                best_match = rule
+        return best_match
+
+    def _find_special_combo(self, primary: str, secondary: str) -> Optional[Dict]:
+        for combo in self._special_combinations:
+            if (self.similarity(combo["colors"][0].lower(), primary) > 70 and
+                    (len(combo["colors"]) == 1 or self.similarity(combo["colors"][1].lower(), secondary) > 70)):
+                return combo["recommendations"]
+        return None
+
+    def _find_design_rule(self, design: str) -> Optional[Dict]:
+        for rule in self._design_rules:
+            if fuzz.ratio(rule["design"].lower(), design) > 80:
+                return rule
+        return None
+
+    # --- lookups ------------------------------------------------------------
+
+    def _memoise(self, table: Dict, key, compute):
+        value = compute()
+        with self._memo_lock:
+            if len(table) < _MAX_MEMO_ENTRIES:
+                table[key] = value
+        return value
+
+    def similarity(self, a: str, b: str) -> int:
+        """fuzz.ratio of two lower-cased colour names."""
+        score = self._similarity.get((a, b))
+        if score is None:
+            score = self._memoise(self._similarity, (a, b), lambda: fuzz.ratio(a, b))
+        return score
+
+    def shoe_rule(self, category: str, sub_category: str, gender: str) -> Optional[Dict]:
+        key = (category.lower(), sub_category.lower())
+        rule = self._shoe_index.get((*key, gender.lower())) or self._shoe_index.get((*key, ANY_GENDER))
+        return dict(rule) if rule else None
+
+    def color_rule(self, colors: List[str]) -> Optional[Dict]:
+        primary = colors[0].lower() if colors else ""
+        secondary = colors[1].lower() if len(colors) > 1 else None
+        key = (primary, secondary)
+        if key in self._color_rule_table:
+            return self._color_rule_table[key]
+        return self._memoise(self._color_rule_table, key, lambda: self._best_color_rule(primary, secondary))
+
+    def design_rule(self, design: str) -> Optional[Dict]:
+        design = design.lower()
+        if design in self._design_table:
+            return self._design_table[design]
+        return self._memoise(self._design_table, design, lambda: self._find_design_rule(design))
+
+    def special_combo(self, colors: List[str]) -> Optional[Dict]:
+        if not self._special_combinations or not colors:
+            return None
+        primary = colors[0].lower()
+        secondary = colors[1].lower() if len(colors) > 1 else ""
+        key = (primary, secondary)
+        if key in self._special_table:
+            return self._special_table[key]
+        return self._memoise(self._special_table, key, lambda: self._find_special_combo(primary, secondary))
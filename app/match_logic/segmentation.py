@@ -0,0 +1,42 @@
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .resolution import fit_within, max_side
+
+
+def scale_polygon(polygon: np.ndarray, scale: float) -> np.ndarray:
+    """Map a mask outline found on a copy resized by scale back onto the original image"""
+    polygon = np.asarray(polygon, dtype=np.float32)
+    return polygon if scale == 1.0 else polygon / scale
+
+
+def polygon_mask(shape: Tuple[int, int], polygon: np.ndarray, offset: Tuple[float, float] = (0, 0),
+                 scale: float = 1.0) -> np.ndarray:
+    """Rasterise an (N, 2) x/y outline into a uint8 0/255 mask of the given (height, width)"""
+    mask = np.zeros(shape[:2], dtype=np.uint8)
+    if polygon is None or len(polygon) < 3:
+        return mask
+    points = (np.asarray(polygon, dtype=np.float32) - np.asarray(offset, dtype=np.float32)) * scale
+    cv2.fillPoly(mask, [np.round(points).astype(np.int32)], 255)
+    return mask
+
+
+def masked_crop(image: np.ndarray, box: Tuple[int, int, int, int], polygon: np.ndarray) -> Optional[np.ndarray]:
+    """
+    RGBA crop of a BGR image with the detector's mask as alpha, in the same
+    form rembg returns: transparent pixels are (0, 0, 0, 0). The crop is capped
+    at the "rembg" max side like the rembg path. None if the box is empty.
+    """
+    x1, y1, x2, y2 = box
+    cropped = image[y1:y2, x1:x2]
+    if cropped.size == 0:
+        return None
+
+    cropped, scale = fit_within(cropped, max_side("rembg"))
+    rgba = cv2.cvtColor(cropped, cv2.COLOR_BGR2RGBA)
+    alpha = polygon_mask(cropped.shape, polygon, offset=(x1, y1), scale=scale)
+    rgba[alpha == 0] = 0
+    rgba[:, :, 3] = alpha
+    return rgba
@@ -0,0 +1,120 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.metrics import timed
+from .resolution import for_stage
+
+# Alpha at or above this counts as shoe; rembg's soft edges below it are ignored
+ALPHA_THRESHOLD = 128
+
+# Border kept around the bounding box so Canny sees the shoe's outline edge
+_EDGE_PAD = 2
+
+
+def _main_span(profile: np.ndarray) -> Optional[Tuple[int, int]]:
+    """
+    [start, stop) of the run of non-empty rows/columns holding the most shoe
+    pixels. Separate specks end up in other runs, so this picks the shoe's
+    extent the way the largest connected component did, without labelling.
+    """
+    occupied = profile > 0
+    if not occupied.any():
+        return None
+    edges = np.diff(np.concatenate(([0], occupied.view(np.int8), [0])))
+    starts, stops = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    if len(starts) == 1:
+        return int(starts[0]), int(stops[0])
+    cumulative = np.concatenate(([0], np.cumsum(profile)))
+    best = int(np.argmax(cumulative[stops] - cumulative[starts]))
+    return int(starts[best]), int(stops[best])
+
+
+@dataclass
+class ShapeFeatures:
+    """
+    Intermediates shared by the shape and texture attributes of one RGBA crop,
+    computed once: the alpha mask, the shoe's bounding box, and the grey image
+    and Canny edge map of the bounding-box region.
+    """
+    mask: np.ndarray                            # bool, full (capped) crop
+    bbox: Optional[Tuple[int, int, int, int]]   # (min_row, min_col, max_row, max_col), regionprops order
+    gray: Optional[np.ndarray]                  # uint8, bounding box plus padding
+    edges: Optional[np.ndarray]                 # Canny(50, 150) of gray
+
+    @property
+    def aspect_ratio(self) -> Optional[float]:
+        if self.bbox is None:
+            return None
+        min_row, min_col, max_row, max_col = self.bbox
+        return (max_row - min_row) / (max_col - min_col)
+
+
+@timed("shape_features")
+def extract_shape_features(rgba_array: np.ndarray) -> ShapeFeatures:
+    rgba_array = for_stage(rgba_array, "shape")
+    mask = rgba_array[:, :, 3] >= ALPHA_THRESHOLD
+
+    # Row/column projections give the bounding box in two reductions over the mask
+    rows = _main_span(np.count_nonzero(mask, axis=1))
+    cols = _main_span(np.count_nonzero(mask, axis=0))
+    if rows is None or cols is None:
+        return ShapeFeatures(mask=mask, bbox=None, gray=None, edges=None)
+    bbox = (rows[0], cols[0], rows[1], cols[1])
+
+    # Grey and edges only for the shoe's region; outside it the crop is transparent black
+    height, width = mask.shape
+    top, left = max(0, rows[0] - _EDGE_PAD), max(0, cols[0] - _EDGE_PAD)
+    bottom, right = min(height, rows[1] + _EDGE_PAD), min(width, cols[1] + _EDGE_PAD)
+    gray = cv2.cvtColor(np.ascontiguousarray(rgba_array[top:bottom, left:right, :3]), cv2.COLOR_RGB2GRAY)
+    edges = cv2.Canny(gray, 50, 150)
+    return ShapeFeatures(mask=mask, bbox=bbox, gray=gray, edges=edges)
+
+
+# Heights produced by classify_height
+HEIGHT_VOCABULARY = ["high-top", "mid-top", "low-top", "unknown"]
+
+
+def classify_height(features: ShapeFeatures) -> str:
+    """high-top / mid-top / low-top from the bounding box aspect ratio"""
+    ratio = features.aspect_ratio
+    if ratio is None:
+        return "unknown"
+    if ratio > 1.4:
+        return "high-top"
+    elif ratio > 1.0:
+        return "mid-top"
+    return "low-top"
+
+
+def classify_design(features: ShapeFeatures) -> str:
+    """striped / patterned / solid from the shared edge map"""
+    if features.edges is None:
+        return "unknown"
+
+    # Detect lines
+    lines = cv2.HoughLinesP(
+        features.edges,
+        rho=1,
+        theta=np.pi / 180,
+        threshold=30,
+        minLineLength=20,
+        maxLineGap=10
+    )
+
+    if lines is not None and len(lines) > 2:
+        return "striped"
+
+    # Check for other patterns
+    contours, _ = cv2.findContours(
+        features.edges,
+        cv2.RETR_EXTERNAL,
+        cv2.CHAIN_APPROX_SIMPLE
+    )
+
+    if len(contours) > 5:
+        return "patterned"
+
+    return "solid"
@@ -0,0 +1,54 @@
+import json
+import numpy as np
+import onnxruntime as ort
+from typing import Dict, Optional, Tuple
+
+# Graph output holding the backbone embedding (written by utils/export_onnx.py)
+FEATURES_OUTPUT = "features"
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class OnnxBackend:
+    """
+    ONNX Runtime inference from the graph written by utils/export_onnx.py.
+    Every head is a named graph output; the label classes come from the
+    JSON file exported next to it, so torch is never imported.
+    """
+    name = "onnx"
+
+    def __init__(self, onnx_path: str, labels_path: str, intra_op_threads: int = 2, inter_op_threads: int = 1):
+        with open(labels_path, 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+        self.columns = labels["columns"]
+        self.classes = {col: np.asarray(labels["classes"][col]) for col in self.columns}
+
+        sess_opts = ort.SessionOptions()
+        sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        sess_opts.intra_op_num_threads = intra_op_threads
+        sess_opts.inter_op_num_threads = inter_op_threads
+        self.session = ort.InferenceSession(onnx_path, sess_options=sess_opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+        outputs = {o.name for o in self.session.get_outputs()}
+        missing = set(self.columns) - outputs
+        if missing:
+            raise ValueError(f"ONNX graph is missing outputs for: {', '.join(sorted(missing))}")
+        # Graphs exported before the embedding output was added still serve predictions
+        self.has_features = FEATURES_OUTPUT in outputs
+        self.output_names = self.columns + ([FEATURES_OUTPUT] if self.has_features else [])
+
+    def run(self, batch: np.ndarray) -> Dict[str, np.ndarray]:
+        """Softmax probabilities per head for an Nx3x224x224 float32 batch."""
+        return self.run_with_features(batch)[0]
+
+    def run_with_features(self, batch: np.ndarray) -> Tuple[Dict[str, np.ndarray], Optional[np.ndarray]]:
+        """run() plus the Nx512 backbone embeddings, or None for graphs without a features output."""
+        outputs = self.session.run(self.output_names, {self.input_name: batch})
+        probs = {col: softmax(out) for col, out in zip(self.columns, outputs)}
+        return probs, outputs[-1] if self.has_features else None
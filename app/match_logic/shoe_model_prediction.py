@@ -1,69 +1,132 @@
-import torch
-import torch.nn as nn
-from torchvision import models, transforms  # Import models here
 from PIL import Image
 import numpy as np
+import logging
 import os
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+from app.config.config import (MODEL_BATCHING_ENABLED, MODEL_BATCH_MAX_SIZE, MODEL_BATCH_MAX_WAIT_MS,
+                               MODEL_BACKEND, MODEL_PRECISION, MODEL_CALIBRATION_DIR,
+                               EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_MAX_DISTANCE, EMBEDDING_CACHE_MAX_ENTRIES,
+                               EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_SAVE_EVERY)
+from app.metrics import timed
+from app.thread_budget import budget, reapply_runtime
+from .batching import MicroBatcher
+from .embedding_index import EmbeddingIndex
+from .model_registry import registry
+
+logger = logging.getLogger(__name__)
 
 # Initialize the model path
 script_dir = os.path.dirname(os.path.abspath(__file__))
 model_path = os.path.abspath(os.path.join(script_dir, "..", "..", "model", "best_shoe_model.pth"))
+onnx_model_path = os.path.abspath(os.path.join(script_dir, "..", "..", "model", "best_shoe_model.onnx"))
+onnx_labels_path = os.path.abspath(os.path.join(script_dir, "..", "..", "model", "best_shoe_model.labels.json"))
 
+# Same preprocessing as the training transform: Resize(224) -> ToTensor -> Normalize
+INPUT_SIZE = (224, 224)
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
 
-# === Your model class (same as training) ===
-class MultiOutputShoeModelResNet18(nn.Module):
-    def __init__(self, n_outputs):
-        super(MultiOutputShoeModelResNet18, self).__init__()
-        self.base = models.resnet18(pretrained=False)
-        self.base.fc = nn.Identity()
-
-        for param in self.base.parameters():
-            param.requires_grad = False
-        for param in self.base.layer4.parameters():
-            param.requires_grad = True
-
-        self.fc_layers = nn.ModuleDict()
-        for col in n_outputs:
-            self.fc_layers[col] = nn.Sequential(
-                nn.Linear(512, 1024),
-                nn.BatchNorm1d(1024),
-                nn.ReLU(),
-                nn.Dropout(0.5),
-                nn.Linear(1024, 512),
-                nn.BatchNorm1d(512),
-                nn.ReLU(),
-                nn.Dropout(0.3),
-                nn.Linear(512, n_outputs[col])
-            )
-
-    def forward(self, x):
-        features = self.base(x)
-        return {col: self.fc_layers[col](features) for col in n_outputs}
-
-
-# === Load the model checkpoint ===
-checkpoint = torch.load(model_path, map_location='cpu', weights_only=False)
-
-# Extract the number of outputs for each column from the checkpoint
-n_outputs = {col: len(checkpoint['label_encoders'][col].classes_) for col in checkpoint['columns']}
-
-# Initialize the model and load the state_dict
-model = MultiOutputShoeModelResNet18(n_outputs)
-model.load_state_dict(checkpoint['model_state_dict'])
-model.eval()
-
-# Label encoders and column names from the checkpoint
-label_encoders = checkpoint['label_encoders']
-columns = checkpoint['columns']
-# ✅ Define transform globally (outside the function)
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                         std=[0.229, 0.224, 0.225])
-])
 
+def load_backend(name: str = MODEL_BACKEND, precision: str = MODEL_PRECISION):
+    """Create the inference backend; torch is only imported for the torch backend."""
+    if name == "torch":
+        from .shoe_model_torch import TorchBackend
+        reapply_runtime()
+        return TorchBackend(model_path, precision=precision, calibration_dir=MODEL_CALIBRATION_DIR)
+    if name == "onnx":
+        if precision != "fp32":
+            logger.warning(f"Model precision '{precision}' applies to the torch backend only; serving ONNX in fp32.")
+        from .shoe_model_onnx import OnnxBackend
+        return OnnxBackend(onnx_model_path, onnx_labels_path,
+                           intra_op_threads=budget.model_onnx_intra_op_threads,
+                           inter_op_threads=budget.model_onnx_inter_op_threads)
+    raise ValueError(f"Unknown model backend '{name}'. Use 'torch' or 'onnx'.")
+
+
+def _warm_up_backend(model_backend):
+    model_backend.run(np.zeros((1, 3, *INPUT_SIZE), dtype=np.float32))
+
+
+# === Load the model (once, by the registry at startup or on first use) ===
+registry.register("attribute_model", load_backend, _warm_up_backend)
+
+
+def get_backend():
+    return registry.get("attribute_model")
+
+
+def preprocess_crop(rgba_array: np.ndarray) -> np.ndarray:
+    """
+    Convert an RGBA crop (alpha ignored) into a normalised 3x224x224 float32
+    array, matching torchvision's Resize/ToTensor/Normalize on a PIL image.
+    """
+    img = Image.fromarray((rgba_array[:, :, :3]).astype(np.uint8), mode='RGB')
+    img = img.resize(INPUT_SIZE, Image.BILINEAR)
+    chw = np.asarray(img, dtype=np.float32).transpose(2, 0, 1) / 255.0
+    return (chw - MEAN) / STD
+
+
+def decode_probabilities(probs: Dict[str, np.ndarray], model_backend=None) -> List[Dict[str, Dict[str, str]]]:
+    """Turn per-head probabilities into one {column: {label, confidence}} dict per row."""
+    model_backend = model_backend or get_backend()
+    n_rows = len(next(iter(probs.values())))
+    predicted = [{} for _ in range(n_rows)]
+    for col in model_backend.columns:
+        predicted_idx = probs[col].argmax(axis=1)
+        confidences = probs[col][np.arange(n_rows), predicted_idx]
+        labels = model_backend.classes[col][predicted_idx]
+
+        for i, (label, confidence) in enumerate(zip(labels.tolist(), confidences.tolist())):
+            predicted[i][col] = {
+                "label": label,
+                "confidence": f"{confidence * 100:.1f}"  # e.g., '94.6'
+            }
+
+    return predicted
+
+
+@timed("model_forward")
+def forward_batch(crops: List[np.ndarray]) -> List[Tuple[Dict[str, Dict[str, str]], Optional[np.ndarray]]]:
+    """
+    Run one forward pass over a batch of preprocessed crops and decode every
+    head. Returns one ({column: {label, confidence}}, 512-d embedding) pair per
+    crop; the embedding is None for ONNX graphs exported without it.
+    """
+    batch = np.ascontiguousarray(np.stack(crops), dtype=np.float32)
+    model_backend = get_backend()
+    probs, features = model_backend.run_with_features(batch)
+    predicted = decode_probabilities(probs, model_backend)
+    return list(zip(predicted, features if features is not None else [None] * len(predicted)))
+
+
+# The same shoe in a different photo gets the predictions stored for it, so its labels
+# stay consistent; the index is tied to the weights and the backend/precision serving them
+embedding_index = EmbeddingIndex(
+    max_distance=EMBEDDING_CACHE_MAX_DISTANCE,
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+    path=EMBEDDING_CACHE_PATH,
+    save_every=EMBEDDING_CACHE_SAVE_EVERY,
+    watched_paths=[model_path, onnx_model_path, onnx_labels_path],
+    model_key=f"{MODEL_BACKEND}:{MODEL_PRECISION}"
+) if EMBEDDING_CACHE_ENABLED else None
+
+
+def _consistent(predicted: Dict[str, Dict[str, str]], embedding: Optional[np.ndarray]) -> Dict[str, Dict[str, str]]:
+    return embedding_index.reuse(predicted, embedding) if embedding_index is not None else predicted
+
+
+def predict_batch(crops: List[np.ndarray]) -> List[Dict[str, Dict[str, str]]]:
+    """One {column: {label, confidence}} dict per preprocessed crop, from one forward pass."""
+    return [_consistent(predicted, embedding) for predicted, embedding in forward_batch(crops)]
+
+
+# Concurrent callers are grouped into one forward pass by a background scheduler
+batcher = MicroBatcher(
+    forward_batch,
+    max_batch_size=MODEL_BATCH_MAX_SIZE,
+    max_wait_ms=MODEL_BATCH_MAX_WAIT_MS,
+    name="resnet-batcher"
+) if MODEL_BATCHING_ENABLED else None
 
 
 def predict_model_properties(rgba_array: np.ndarray) -> Dict[str, Dict[str, str]]:
@@ -71,41 +134,30 @@ def predict_model_properties(rgba_array: np.ndarray) -> Dict[str, Dict[str, str]
     Predict advanced shoe properties using your trained multi-output ResNet18 model.
     Converts RGBA array to PIL Image -> applies transformations -> model predicts.
     Skips preprocessing since the shoe is already cropped by YOLO.
+    When batching is enabled the forward pass is shared with concurrent callers.
+    With the embedding cache on, a near-duplicate of a stored shoe gets its predictions.
     """
-    try:
-        # Convert RGBA numpy array to PIL Image (ignore alpha channel)
-        img = Image.fromarray((rgba_array[:, :, :3]).astype(np.uint8), mode='RGB')
-
-        # Apply correct preprocessing: resize + normalize
-        img_tensor = transform(img).unsqueeze(0)
-
-        with torch.no_grad():
-            outputs = model(img_tensor)
-
-        predicted_labels = {}
-        for col in columns:
-            # Apply softmax to get probabilities
-            probs = torch.softmax(outputs[col], dim=1)
-            confidence, predicted_idx = torch.max(probs, 1)
+    return _consistent(*predict_with_embedding(rgba_array))
 
-            label = label_encoders[col].inverse_transform(predicted_idx.cpu().numpy())[0]
-            confidence_percent = f"{confidence.item() * 100:.1f}"  # e.g., '94.6%'
 
-            predicted_labels[col] = {
-                "label": label,
-                "confidence": confidence_percent
-            }
+@timed("predict_model_properties")
+def predict_with_embedding(rgba_array: np.ndarray) -> Tuple[Dict[str, Dict[str, str]], Optional[np.ndarray]]:
+    """predict_model_properties plus the crop's backbone embedding (None if unavailable)."""
+    try:
+        # Apply correct preprocessing: resize + normalize
+        crop = preprocess_crop(rgba_array)
 
-        return predicted_labels
+        if batcher is not None:
+            return batcher(crop)
+        return forward_batch([crop])[0]
 
     except Exception as e:
         print(f"Model prediction error: {e}")
-        return {}
-#
-# # Test it by calling the function with an RGBA array (cropped shoe image from YOLO)
-# if __name__ == "__main__":
-#     # Placeholder example, replace with actual RGBA data from YOLO
-#     rgba_array = np.random.rand(224, 224, 4) * 255  # Example RGBA array
-#     result = predict_model_properties(rgba_array)
-#     print("Predicted Shoe Attributes with Confidence:")
-#     print(result)
+        return {}, None
+
+
+def get_batching_stats() -> Dict:
+    """Batch sizes and queue waits seen by the attribute model scheduler."""
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
@@ -0,0 +1,82 @@
+import glob
+import logging
+import os
+from typing import Iterable, List
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_EXTENSIONS = ("*.jpg", "*.jpeg", "*.png", "*.bmp", "*.webp")
+
+
+def select_engine() -> str:
+    """Pick the best available quantized kernel backend for this CPU."""
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    raise RuntimeError("No quantized engine available in this torch build")
+
+
+def calibration_paths(folder: str, exclude: Iterable[str] = ()) -> List[str]:
+    """Calibration images in folder, minus any in exclude (e.g. the images an accuracy report scores)"""
+    excluded = {os.path.realpath(p) for p in exclude}
+    paths = []
+    for ext in CALIBRATION_EXTENSIONS:
+        paths.extend(sorted(glob.glob(os.path.join(folder, ext))))
+    return [p for p in paths if os.path.realpath(p) not in excluded]
+
+
+def calibration_batches(paths: Iterable[str], batch_size: int = 8) -> List[torch.Tensor]:
+    """Preprocessed calibration crops (each image plus its mirror), batched."""
+    from .shoe_model_prediction import preprocess_crop
+
+    crops = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        rgba = cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+        crops.append(preprocess_crop(rgba))
+        crops.append(preprocess_crop(np.ascontiguousarray(rgba[:, ::-1])))
+    return [torch.from_numpy(np.stack(crops[i:i + batch_size])) for i in range(0, len(crops), batch_size)]
+
+
+def quantize_heads(model: nn.Module) -> nn.Module:
+    """Dynamic INT8 quantisation of the Linear layers in every attribute head."""
+    model.fc_layers = quantize_dynamic(model.fc_layers, {nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def quantize_backbone(model: nn.Module, batches: List[torch.Tensor], engine: str) -> nn.Module:
+    """Static post-training INT8 quantisation of the ResNet18 backbone (FX graph mode)."""
+    qconfig_mapping = get_default_qconfig_mapping(engine)
+    example_inputs = (torch.zeros(1, 3, 224, 224),)
+    prepared = prepare_fx(model.base.eval(), qconfig_mapping, example_inputs)
+    with torch.no_grad():
+        for batch in batches:
+            prepared(batch)
+    model.base = convert_fx(prepared)
+    return model
+
+
+def quantize_model(model: nn.Module, paths: List[str]) -> nn.Module:
+    """
+    INT8 model for CPU inference: heads always get dynamic quantisation;
+    the backbone is statically quantised when calibration images (paths) exist.
+    """
+    engine = select_engine()
+    batches = calibration_batches(paths)
+    if batches:
+        quantize_backbone(model, batches, engine)
+        logger.info(f"Backbone quantised ({engine}) with {len(paths)} calibration images")
+    else:
+        logger.warning("No calibration images; backbone stays float32")
+    quantize_heads(model)
+    return model.eval()
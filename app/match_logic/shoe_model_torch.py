@@ -0,0 +1,85 @@
+import torch
+import torch.nn as nn
+from torchvision import models  # Import models here
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# === Your model class (same as training) ===
+class MultiOutputShoeModelResNet18(nn.Module):
+    def __init__(self, n_outputs):
+        super(MultiOutputShoeModelResNet18, self).__init__()
+        self.base = models.resnet18(pretrained=False)
+        self.base.fc = nn.Identity()
+
+        for param in self.base.parameters():
+            param.requires_grad = False
+        for param in self.base.layer4.parameters():
+            param.requires_grad = True
+
+        self.fc_layers = nn.ModuleDict()
+        for col in n_outputs:
+            self.fc_layers[col] = nn.Sequential(
+                nn.Linear(512, 1024),
+                nn.BatchNorm1d(1024),
+                nn.ReLU(),
+                nn.Dropout(0.5),
+                nn.Linear(1024, 512),
+                nn.BatchNorm1d(512),
+                nn.ReLU(),
+                nn.Dropout(0.3),
+                nn.Linear(512, n_outputs[col])
+            )
+
+    def forward(self, x, return_features: bool = False):
+        features = self.base(x)
+        outputs = {col: head(features) for col, head in self.fc_layers.items()}
+        # The 512-d backbone embedding the heads share (used by the embedding cache)
+        return (outputs, features) if return_features else outputs
+
+
+def load_checkpoint(path: str):
+    """Load the training checkpoint; returns (model in eval mode, columns, label_encoders)."""
+    checkpoint = torch.load(path, map_location='cpu', weights_only=False)
+
+    # Extract the number of outputs for each column from the checkpoint
+    n_outputs = {col: len(checkpoint['label_encoders'][col].classes_) for col in checkpoint['columns']}
+
+    # Initialize the model and load the state_dict
+    model = MultiOutputShoeModelResNet18(n_outputs)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+
+    return model, checkpoint['columns'], checkpoint['label_encoders']
+
+
+class TorchBackend:
+    """Eager PyTorch inference straight from best_shoe_model.pth, in fp32 or int8."""
+    name = "torch"
+
+    def __init__(self, checkpoint_path: str, precision: str = "fp32", calibration_dir: Optional[str] = None,
+                 calibration_exclude: Iterable[str] = ()):
+        if precision not in ("fp32", "int8"):
+            raise ValueError(f"Unknown model precision '{precision}'. Use 'fp32' or 'int8'.")
+        self.precision = precision
+        self.model, self.columns, label_encoders = load_checkpoint(checkpoint_path)
+        self.classes = {col: np.asarray(label_encoders[col].classes_) for col in self.columns}
+
+        # Images the int8 backbone was calibrated on, so reports can keep them out of scoring
+        self.calibration_images: List[str] = []
+        if precision == "int8":
+            from .shoe_model_quantization import calibration_paths, quantize_model
+            if calibration_dir:
+                self.calibration_images = calibration_paths(calibration_dir, exclude=calibration_exclude)
+            self.model = quantize_model(self.model, self.calibration_images)
+
+    def run(self, batch: np.ndarray) -> Dict[str, np.ndarray]:
+        """Softmax probabilities per head for an Nx3x224x224 float32 batch."""
+        return self.run_with_features(batch)[0]
+
+    def run_with_features(self, batch: np.ndarray) -> Tuple[Dict[str, np.ndarray], Optional[np.ndarray]]:
+        """run() plus the Nx512 backbone embeddings from the same forward pass."""
+        with torch.no_grad():
+            outputs, features = self.model(torch.from_numpy(batch), return_features=True)
+        probs = {col: torch.softmax(outputs[col], dim=1).numpy() for col in self.columns}
+        return probs, features.float().numpy()
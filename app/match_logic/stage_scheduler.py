@@ -0,0 +1,223 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Sequence
+
+from app.config.config import STAGE_PYTHON_EXECUTOR
+from app.metrics import STAGE_QUEUE_SECONDS
+from app.thread_budget import budget
+
+logger = logging.getLogger(__name__)
+
+# What a task mostly spends its time on, which decides the pool it runs in:
+# - python: GIL-bound Python/NumPy glue (e.g. KMeans iterations)
+# - native: OpenCV and other code that releases the GIL and may use its own threads
+# - inference: model calls, which mostly wait on the micro-batcher
+RESOURCE_CLASSES = ("python", "native", "inference")
+
+
+@dataclass
+class Task:
+    """
+    One node of a stage graph. fn is called with the results of depends_on
+    (task names, in order) followed by args. Tasks for a process pool must
+    be picklable module-level functions.
+    """
+    fn: Callable
+    resource: str
+    args: tuple = ()
+    depends_on: Sequence[str] = field(default_factory=tuple)
+
+
+def _copy_result(source: Future, target: Future):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class StageScheduler:
+    """
+    Long-lived pools, one per resource class, shared by every request.
+    run() takes a graph of named tasks and starts each one as soon as its
+    dependencies have finished; a failed dependency fails its dependents
+    without running them. Queue waits and run times are tracked per stage.
+    """
+
+    def __init__(self, workers: Dict[str, int], python_executor: str = "thread"):
+        unknown = set(workers) - set(RESOURCE_CLASSES)
+        if unknown:
+            raise ValueError(f"Unknown resource classes {sorted(unknown)}. Use {RESOURCE_CLASSES}.")
+        if python_executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor '{python_executor}'. Use 'thread' or 'process'.")
+        self.workers = {cls: max(1, int(workers.get(cls, 1))) for cls in RESOURCE_CLASSES}
+        self.python_executor = python_executor
+        self._create_pools()
+        # Pool threads do not survive fork(); pre-forked workers get fresh pools
+        os.register_at_fork(after_in_child=self._create_pools)
+
+    def _create_pools(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._pools: Dict[str, Executor] = {}
+        for cls, size in self.workers.items():
+            if cls == "python" and self.python_executor == "process":
+                # spawn, so children never inherit model threads or locks
+                self._pools[cls] = ProcessPoolExecutor(size, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._pools[cls] = ThreadPoolExecutor(size, thread_name_prefix=f"stage-{cls}")
+
+    def _stage(self, stage: str, resource: str) -> Dict[str, Any]:
+        stats = self._stats.get(stage)
+        if stats is None:
+            stats = self._stats[stage] = {
+                "resource": resource, "submitted": 0, "queued": 0, "running": 0, "completed": 0,
+                "failed": 0, "total_wait": 0.0, "max_wait": 0.0, "total_run": 0.0,
+            }
+        return stats
+
+    def _started(self, stage: str, resource: str, wait: float):
+        STAGE_QUEUE_SECONDS.observe(wait, stage=stage, resource=resource)
+        with self._lock:
+            stats = self._stats[stage]
+            stats["queued"] -= 1
+            stats["running"] += 1
+            stats["total_wait"] += wait
+            stats["max_wait"] = max(stats["max_wait"], wait)
+
+    def _finished(self, stage: str, elapsed: float, failed: bool):
+        with self._lock:
+            stats = self._stats[stage]
+            stats["running"] -= 1
+            stats["completed"] += 1
+            stats["failed"] += failed
+            stats["total_run"] += elapsed
+
+    def submit(self, stage: str, resource: str, fn: Callable, *args) -> Future:
+        """Run fn(*args) in the pool for resource, accounted under stage."""
+        pool = self._pools[resource]
+        enqueued = time.perf_counter()
+        with self._lock:
+            stats = self._stage(stage, resource)
+            stats["submitted"] += 1
+            stats["queued"] += 1
+
+        if isinstance(pool, ThreadPoolExecutor):
+            def job():
+                started = time.perf_counter()
+                self._started(stage, resource, started - enqueued)
+                failed = True
+                try:
+                    result = fn(*args)
+                    failed = False
+                    return result
+                finally:
+                    self._finished(stage, time.perf_counter() - started, failed)
+            return pool.submit(job)
+
+        # A process pool only reports completion: its tasks count as running from submission,
+        # and the queue wait is folded into the run time (see stats())
+        self._started(stage, resource, 0.0)
+        future = pool.submit(fn, *args)
+        future.add_done_callback(
+            lambda f: self._finished(stage, time.perf_counter() - enqueued, f.exception() is not None))
+        return future
+
+    def run(self, tasks: Dict[str, Task]) -> Dict[str, Future]:
+        """Start a task graph; returns one future per task name, in the same order."""
+        for name, task in tasks.items():
+            if task.resource not in self._pools:
+                raise ValueError(f"Task '{name}' has unknown resource class '{task.resource}'")
+            missing = [d for d in task.depends_on if d not in tasks]
+            if missing:
+                raise ValueError(f"Task '{name}' depends on unknown tasks {missing}")
+        self._check_acyclic(tasks)
+
+        futures = {name: Future() for name in tasks}
+        for name, task in tasks.items():
+            self._schedule(name, task, futures)
+        return futures
+
+    @staticmethod
+    def _check_acyclic(tasks: Dict[str, Task]):
+        done, visiting = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Task graph has a cycle through '{name}'")
+            visiting.add(name)
+            for dep in tasks[name].depends_on:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in tasks:
+            visit(name)
+
+    def _schedule(self, name: str, task: Task, futures: Dict[str, Future]):
+        deps = [futures[d] for d in task.depends_on]
+        target = futures[name]
+
+        def launch():
+            failed = next((d for d in deps if d.exception() is not None), None)
+            if failed is not None:
+                target.set_exception(failed.exception())
+                return
+            try:
+                inner = self.submit(name, task.resource, task.fn, *[d.result() for d in deps], *task.args)
+            except Exception as e:
+                target.set_exception(e)
+                return
+            inner.add_done_callback(lambda f: _copy_result(f, target))
+
+        if not deps:
+            launch()
+            return
+
+        remaining = [len(deps)]
+        lock = threading.Lock()
+
+        def on_dependency_done(_):
+            with lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                launch()
+
+        for dep in deps:
+            dep.add_done_callback(on_dependency_done)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Per-stage counters. Stages on a process pool ("queue_tracked": False) cannot
+        tell queued from running tasks: queue_depth stays 0, running includes tasks
+        still waiting for a worker, and mean_run_ms includes their queue wait.
+        """
+        process_pool = {cls for cls, pool in self._pools.items() if isinstance(pool, ProcessPoolExecutor)}
+        with self._lock:
+            stages = {
+                stage: {
+                    "resource": s["resource"],
+                    "queue_tracked": s["resource"] not in process_pool,
+                    "submitted": s["submitted"],
+                    "queue_depth": s["queued"],
+                    "running": s["running"],
+                    "completed": s["completed"],
+                    "failed": s["failed"],
+                    "mean_queue_wait_ms": round(s["total_wait"] / s["completed"] * 1000, 2) if s["completed"] else 0.0,
+                    "max_queue_wait_ms": round(s["max_wait"] * 1000, 2),
+                    "mean_run_ms": round(s["total_run"] / s["completed"] * 1000, 2) if s["completed"] else 0.0,
+                }
+                for stage, s in self._stats.items()
+            }
+        return {"workers": dict(self.workers), "python_executor": self.python_executor, "stages": stages}
+
+
+# Shared by every request; replaces the per-call thread pool in extract_shoe_attributes
+scheduler = StageScheduler(budget.stage_workers(), python_executor=STAGE_PYTHON_EXECUTOR)
@@ -1,10 +1,26 @@
-from fastapi import APIRouter, UploadFile, File, Request, HTTPException
-from fastapi.responses import JSONResponse
+import asyncio
+import json
+from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, Form, Query, Request, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+from app.config.config import (MATCH_RETRY_AFTER_SECONDS, MAX_UPLOAD_BYTES, BATCH_MAX_IMAGES,
+                               BATCH_MAX_ZIP_BYTES, ALLOWED_EXTENSIONS, MULTI_SHOE_DEFAULT)
 from app.security import verify_request
-from app.utils import validate_uploaded_file, verify_file_is_image
-from app.match_logic.matcher import SockRecommender
+from app.utils import (validate_uploaded_file, verify_image_bytes, check_image_bytes, is_zip, extract_zip_images,
+                       sniff_image_type)
+from app.worker_pool import match_pool, PoolSaturatedError
+from app.match_logic.matcher import get_recommender, result_cache
+from app.match_logic.shoe_model_prediction import get_batching_stats, embedding_index
+from app.match_logic.match_socks_rule import ShoeAttributes, AttributeWithConfidence
+from app.match_logic.rule_index import DESIGN_VOCABULARY
+from app.match_logic.shape_features import HEIGHT_VOCABULARY
+from app.match_logic.model_registry import registry, rss_mb
+from app.match_logic.batch_pipeline import get_batch_pipeline
+from app.match_logic.stage_scheduler import scheduler
+from app.thread_budget import budget
+from app.metrics import metrics, stats_gauges, MATCH_OUTCOMES
 import os
-import shutil
 import logging
 
 router = APIRouter()
@@ -14,22 +30,212 @@ logger = logging.getLogger("sockmatch-api")
 async def read_root():
     return {"message": "SockMatch AI API is running."}
 
+@router.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz():
+    models = registry.status()
+    if registry.is_ready():
+        state = "ready"
+    elif any(m["state"] == "failed" for m in models.values()):
+        state = "failed"
+    else:
+        state = "loading"
+    return JSONResponse(status_code=200 if state == "ready" else 503, content={"status": state, "models": models})
+
+@router.get("/status")
+async def status_endpoint():
+    return {
+        "models": registry.status(),
+        "match_pool": match_pool.stats(),
+        "model_batching": get_batching_stats(),
+        "stage_scheduler": scheduler.stats(),
+        "thread_budget": budget.as_dict(),
+        "result_cache": result_cache.stats() if result_cache is not None else {"enabled": False},
+        "embedding_cache": embedding_index.stats() if embedding_index is not None else {"enabled": False}
+    }
+
+def collect_runtime_metrics():
+    lines = [
+        "# HELP sockmatch_process_resident_memory_bytes Resident set size of this process.",
+        "# TYPE sockmatch_process_resident_memory_bytes gauge",
+        f"sockmatch_process_resident_memory_bytes {int(rss_mb() * 1024 * 1024)}",
+        "# HELP sockmatch_model_ready Whether each registered model is loaded and warm.",
+        "# TYPE sockmatch_model_ready gauge",
+    ]
+    lines += [f'sockmatch_model_ready{{model="{name}"}} {int(m["state"] == "ready")}'
+              for name, m in registry.status().items()]
+    lines += stats_gauges("sockmatch_match_pool", match_pool.stats(), "match worker pool")
+    lines += stats_gauges("sockmatch_model_batcher", get_batching_stats(), "attribute model micro-batcher")
+    if result_cache is not None:
+        lines += stats_gauges("sockmatch_result_cache", result_cache.stats(), "result cache")
+    if embedding_index is not None:
+        lines += stats_gauges("sockmatch_embedding_cache", embedding_index.stats(), "embedding near-duplicate cache")
+
+    stages = scheduler.stats()["stages"]
+    for key in ("queue_depth", "running"):
+        name = f"sockmatch_scheduler_stage_{key}"
+        lines += [f"# HELP {name} Stage scheduler tasks per stage: {key}.", f"# TYPE {name} gauge"]
+        lines += [f'{name}{{stage="{stage}",resource="{s["resource"]}"}} {s[key]}' for stage, s in stages.items()]
+    return lines
+
+metrics.add_collector(collect_runtime_metrics)
+
+def match_outcome(result) -> str:
+    return "success" if result.get("error") is None else "fallback"
+
+@router.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def run_match(image_bytes: bytes, multi: bool = False):
+    if multi:
+        return get_recommender().match_socks_multi(image_bytes)
+    return get_recommender().match_socks_image(image_bytes)
+
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def stream_format(stream: Optional[str], request: Request) -> Optional[str]:
+    """Streaming is opt-in, via ?stream=ndjson|sse or the Accept header."""
+    if stream:
+        return stream.lower()
+    accept = request.headers.get("accept", "")
+    for fmt, media_type in STREAM_MEDIA_TYPES.items():
+        if media_type in accept:
+            return fmt
+    return None
+
+def format_event(fmt: str, request_id: str, event: str, data) -> str:
+    payload = json.dumps({"request_id": request_id, "event": event, "data": data}, default=str)
+    if fmt == "sse":
+        return f"event: {event}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+def stream_match(image_bytes: bytes, request_id: str, fmt: str) -> StreamingResponse:
+    """
+    Run the pipeline in one match_pool slot and stream its stage events.
+    Admission happens before the response starts, so a full pool is still a 503.
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def on_stage(event: str, data):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    job = match_pool.submit(get_recommender().match_socks_stream, image_bytes, on_stage)
+    job.add_done_callback(lambda _: events.put_nowait(None))
+    job.add_done_callback(lambda j: MATCH_OUTCOMES.inc(
+        endpoint="match", outcome="error" if j.exception() else match_outcome(j.result())))
+
+    async def body():
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            yield format_event(fmt, request_id, *item)
+        if job.exception() is not None:
+            logger.error(f"[{request_id}] Streaming match failed: {job.exception()}")
+            yield format_event(fmt, request_id, "error", {"error": "Internal server error while processing the image."})
+
+    return StreamingResponse(body(), media_type=STREAM_MEDIA_TYPES[fmt],
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.post("/config/reload")
+async def reload_config_endpoint(request: Request):
+    request_id = verify_request(request)
+    matcher = get_recommender().matcher
+    reloaded = matcher.reload(force=True)
+    logger.info(f"[{request_id}] Style config reload requested, reloaded={reloaded}")
+    if not reloaded:
+        # A broken config file on the server; the previous rules stay active
+        raise HTTPException(
+            status_code=500,
+            detail={"request_id": request_id, "status": "error", "reloaded": False,
+                    "error": "Style config could not be reloaded; the previous config is still active."}
+        )
+    return {"request_id": request_id, "status": "success", "reloaded": True}
+
 @router.post("/match")
-async def match_endpoint(file: UploadFile = File(...), request: Request = None):
+async def match_endpoint(file: UploadFile = File(...), request: Request = None,
+                         stream: Optional[str] = Query(None, description="Stream stage events as 'ndjson' or 'sse'"),
+                         multi: bool = Query(MULTI_SHOE_DEFAULT, description="Analyse every shoe in the photo")):
     request_id = verify_request(request)
-    file_location = None
 
     try:
+        fmt = stream_format(stream, request)
+        if fmt is not None and fmt not in STREAM_MEDIA_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail={"request_id": request_id, "status": "error", "error": f"Unsupported stream format {fmt}. Use ndjson or sse."}
+            )
+        if fmt is not None and multi:
+            raise HTTPException(
+                status_code=400,
+                detail={"request_id": request_id, "status": "error", "error": "Streaming is only available for single-shoe matching."}
+            )
+
         validate_uploaded_file(file, request_id)
 
-        file_location = f"temp_{request_id}_{file.filename}"
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Read once into memory (one byte past the limit so oversize uploads are detectable)
+        image_bytes = await file.read(MAX_UPLOAD_BYTES + 1)
+        verify_image_bytes(image_bytes, request_id)
+
+        if fmt is not None:
+            return stream_match(image_bytes, request_id, fmt)
+
+        # The pipeline is CPU-bound and blocking; keep it off the event loop
+        result = await match_pool.run(run_match, image_bytes, multi)
+        MATCH_OUTCOMES.inc(endpoint="match", outcome=match_outcome(result))
+
+        return JSONResponse(content={
+            "request_id": request_id,
+            "status": "success",
+            "result": result
+        })
+
+    except HTTPException:
+        MATCH_OUTCOMES.inc(endpoint="match", outcome="invalid")
+        raise
+
+    except PoolSaturatedError as e:
+        MATCH_OUTCOMES.inc(endpoint="match", outcome="rejected")
+        logger.warning(f"[{request_id}] Rejected, server busy: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail={"request_id": request_id, "status": "error", "error": "Server is busy, please retry shortly."},
+            headers={"Retry-After": str(MATCH_RETRY_AFTER_SECONDS)}
+        )
+
+    except Exception as e:
+        MATCH_OUTCOMES.inc(endpoint="match", outcome="error")
+        logger.exception(f"[{request_id}] Internal server error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={"request_id": request_id, "status": "error", "error": "Internal server error while processing the image."}
+        )
+
+def run_crop_match(crop_bytes: bytes, gender: str):
+    return get_recommender().match_socks_crop(crop_bytes, gender)
+
+@router.post("/match/crop")
+async def match_crop_endpoint(file: UploadFile = File(...), gender: str = Form("unisex"), request: Request = None):
+    """Match a shoe that is already cropped with its background removed (transparent PNG); skips YOLO and rembg."""
+    request_id = verify_request(request)
 
-        verify_file_is_image(file_location, request_id)
+    try:
+        validate_uploaded_file(file, request_id)
+        crop_bytes = await file.read(MAX_UPLOAD_BYTES + 1)
+        verify_image_bytes(crop_bytes, request_id)
+        if sniff_image_type(crop_bytes) != "png":
+            raise HTTPException(
+                status_code=400,
+                detail={"request_id": request_id, "status": "error", "error": "Crops must be transparent PNG images."}
+            )
 
-        sock_recommender = SockRecommender()
-        result = sock_recommender.match_socks(file_location)
+        result = await match_pool.run(run_crop_match, crop_bytes, gender)
+        MATCH_OUTCOMES.inc(endpoint="match_crop", outcome=match_outcome(result))
 
         return JSONResponse(content={
             "request_id": request_id,
@@ -38,15 +244,169 @@ async def match_endpoint(file: UploadFile = File(...), request: Request = None):
         })
 
     except HTTPException:
+        MATCH_OUTCOMES.inc(endpoint="match_crop", outcome="invalid")
         raise
 
+    except PoolSaturatedError as e:
+        MATCH_OUTCOMES.inc(endpoint="match_crop", outcome="rejected")
+        logger.warning(f"[{request_id}] Rejected, server busy: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail={"request_id": request_id, "status": "error", "error": "Server is busy, please retry shortly."},
+            headers={"Retry-After": str(MATCH_RETRY_AFTER_SECONDS)}
+        )
+
     except Exception as e:
+        MATCH_OUTCOMES.inc(endpoint="match_crop", outcome="error")
         logger.exception(f"[{request_id}] Internal server error: {e}")
         raise HTTPException(
             status_code=500,
             detail={"request_id": request_id, "status": "error", "error": "Internal server error while processing the image."}
         )
 
-    finally:
-        if file_location and os.path.exists(file_location):
-            os.remove(file_location)
+class LabelPayload(BaseModel):
+    label: str = Field(min_length=1, max_length=64)
+    confidence: float = Field(100.0, ge=0, le=100)
+
+class ShoeAttributesPayload(BaseModel):
+    """The ShoeAttributes the style rules take; values use the same vocabulary as /match's shoe_analysis."""
+    height: str = Field(max_length=32)
+    colors: List[str] = Field(min_length=1, max_length=8)
+    design: str = Field("solid", max_length=32)
+    gender: str = Field("unisex", max_length=32)
+    season: Optional[str] = Field(None, max_length=32)
+    category: Optional[LabelPayload] = None
+    sub_category: Optional[LabelPayload] = None
+
+    @field_validator("height")
+    @classmethod
+    def known_height(cls, value: str) -> str:
+        if value.lower() not in HEIGHT_VOCABULARY:
+            raise ValueError(f"height must be one of {', '.join(HEIGHT_VOCABULARY)}")
+        return value
+
+    @field_validator("design")
+    @classmethod
+    def known_design(cls, value: str) -> str:
+        if value.lower() not in DESIGN_VOCABULARY:
+            raise ValueError(f"design must be one of {', '.join(DESIGN_VOCABULARY)}")
+        return value
+
+    def to_attributes(self) -> ShoeAttributes:
+        def label(value: Optional[LabelPayload]) -> Optional[AttributeWithConfidence]:
+            return AttributeWithConfidence(label=value.label, confidence=value.confidence) if value else None
+
+        return ShoeAttributes(
+            height=self.height.lower(),
+            colors=[c.lower() for c in self.colors],
+            design=self.design.lower(),
+            gender=self.gender.lower(),
+            season=self.season.lower() if self.season else None,
+            category=label(self.category),
+            sub_category=label(self.sub_category)
+        )
+
+@router.post("/match/attributes")
+async def match_attributes_endpoint(payload: ShoeAttributesPayload, request: Request):
+    """Match precomputed shoe attributes: only the style rules run, so this stays on the event loop."""
+    request_id = verify_request(request)
+
+    result = get_recommender().match_attributes(payload.to_attributes())
+    MATCH_OUTCOMES.inc(endpoint="match_attributes", outcome=match_outcome(result))
+    return JSONResponse(content={
+        "request_id": request_id,
+        "status": "success",
+        "result": result
+    })
+
+def run_batch(images: List[bytes], gender: str):
+    return get_batch_pipeline().run(images, gender)
+
+async def read_batch_uploads(files: List[UploadFile], request_id: str):
+    """(filename, bytes or None, error or None) per image; zip uploads are expanded in place."""
+    entries = []
+    for file in files:
+        # Image-sized read first; only a part that sniffs as a zip may grow to the archive cap
+        data = await file.read(MAX_UPLOAD_BYTES + 1)
+        if is_zip(data):
+            remaining = BATCH_MAX_ZIP_BYTES + 1 - len(data)
+            if remaining > 0:
+                data += await file.read(remaining)
+            if len(data) > BATCH_MAX_ZIP_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail={"request_id": request_id, "status": "error", "error": f"Zip archive exceeds {BATCH_MAX_ZIP_BYTES} bytes."}
+                )
+            # Decompression is CPU-bound; keep it off the event loop
+            entries.extend(await asyncio.to_thread(extract_zip_images, data, request_id))
+        else:
+            entries.append((file.filename, data))
+
+        if len(entries) > BATCH_MAX_IMAGES:
+            raise HTTPException(
+                status_code=413,
+                detail={"request_id": request_id, "status": "error", "error": f"Batch exceeds {BATCH_MAX_IMAGES} images."}
+            )
+
+    checked = []
+    for filename, data in entries:
+        _, ext = os.path.splitext((filename or "").lower())
+        if ext not in ALLOWED_EXTENSIONS:
+            error = f"Unsupported file type {ext}. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+        else:
+            error = check_image_bytes(data)
+        checked.append((filename, None if error else data, error))
+    return checked
+
+@router.post("/match/batch")
+async def match_batch_endpoint(files: List[UploadFile] = File(...), gender: str = Form("unisex"), request: Request = None):
+    request_id = verify_request(request)
+
+    try:
+        entries = await read_batch_uploads(files, request_id)
+        if not entries:
+            raise HTTPException(
+                status_code=400,
+                detail={"request_id": request_id, "status": "error", "error": "No images uploaded."}
+            )
+
+        valid = [i for i, (_, data, _) in enumerate(entries) if data is not None]
+        matched = await match_pool.run(run_batch, [entries[i][1] for i in valid], gender) if valid else []
+        matched = dict(zip(valid, matched))
+
+        results = []
+        for index, (filename, _, error) in enumerate(entries):
+            result = matched.get(index)
+            MATCH_OUTCOMES.inc(endpoint="match_batch", outcome=match_outcome(result) if result is not None else "invalid")
+            if result is not None and result.get("error") is None:
+                results.append({"index": index, "filename": filename, "status": "success", "result": result})
+            else:
+                results.append({"index": index, "filename": filename, "status": "error",
+                                "error": error or result["error"], "result": result})
+
+        logger.info(f"[{request_id}] Batch of {len(entries)} images, "
+                    f"{sum(r['status'] == 'success' for r in results)} matched")
+        return JSONResponse(content={
+            "request_id": request_id,
+            "status": "success",
+            "results": results
+        })
+
+    except HTTPException:
+        raise
+
+    except PoolSaturatedError as e:
+        MATCH_OUTCOMES.inc(endpoint="match_batch", outcome="rejected")
+        logger.warning(f"[{request_id}] Rejected, server busy: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail={"request_id": request_id, "status": "error", "error": "Server is busy, please retry shortly."},
+            headers={"Retry-After": str(MATCH_RETRY_AFTER_SECONDS)}
+        )
+
+    except Exception as e:
+        logger.exception(f"[{request_id}] Internal server error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail={"request_id": request_id, "status": "error", "error": "Internal server error while processing the batch."}
+        )
@@ -0,0 +1,110 @@
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict
+
+import uvicorn
+
+from app.config.config import MODEL_BACKEND, SEGMENTATION_MODE
+from app.match_logic.model_registry import registry, rss_mb
+from app.thread_budget import budget, apply_runtime
+
+logger = logging.getLogger("sockmatch-api")
+
+# Models whose weights are loaded once in the parent and shared copy-on-write.
+# ONNX Runtime sessions (rembg, the onnx attribute backend) own thread pools that
+# do not survive fork(), so those are created inside each worker instead.
+SHARED_MODELS = (["yolo_seg"] if SEGMENTATION_MODE == "detector" else ["yolo"]) + \
+    (["attribute_model"] if MODEL_BACKEND == "torch" else [])
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, index: int, threads: int):
+    # Runs in the forked child: give it its own thread budget, then serve on the shared socket.
+    # The app lifespan warms the shared models and loads the per-worker ones.
+    apply_runtime(threads, budget.torch_interop_threads)
+    print(f"[WORKER {index}] pid {os.getpid()} serving with {threads} native threads; "
+          f"RSS {rss_mb():.2f} MB right after fork.")
+    config = uvicorn.Config(app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _fork_worker(app, sock: socket.socket, index: int, threads: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            _run_worker(app, sock, index, threads)
+        except Exception:
+            logger.exception(f"[WORKER {index}] crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve_prefork(app, host: str, port: int, workers: int):
+    """
+    Load the shared model weights once, then fork `workers` uvicorn
+    processes that accept on one listening socket. Pages holding the
+    weights stay shared between workers until written to.
+    """
+    # The budget already divides the cores between the configured worker count
+    threads = budget.native_threads
+
+    # Keep the parent single-threaded in native libraries so no OpenMP
+    # pool exists at fork time; each worker sets its own budget.
+    apply_runtime(1)
+    registry.load(SHARED_MODELS, warm=False)
+    print(f"[BASE MEMORY] Parent holds {', '.join(SHARED_MODELS)}: {rss_mb():.2f} MB before forking {workers} workers.")
+
+    # Move everything allocated so far out of the GC's reach so collections
+    # in the workers do not touch (and un-share) those pages.
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind_socket(host, port)
+    children: Dict[int, int] = {}
+    for index in range(workers):
+        children[_fork_worker(app, sock, index, threads)] = index
+
+    stopping = False
+
+    def _shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        logger.warning(f"[WORKER {index}] pid {pid} exited with status {status}; restarting")
+        time.sleep(1)
+        children[_fork_worker(app, sock, index, threads)] = index
+
+    sock.close()
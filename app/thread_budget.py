@@ -0,0 +1,168 @@
+import os
+import sys
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+from app.config.config import (THREAD_PROFILE, THREAD_BUDGET_CPUS, WORKERS, WORKER_THREADS, MATCH_MAX_WORKERS,
+                               REMBG_INTRA_OP_THREADS, REMBG_INTER_OP_THREADS, MODEL_ONNX_INTRA_OP_THREADS,
+                               MODEL_ONNX_INTER_OP_THREADS, STAGE_PYTHON_WORKERS, STAGE_NATIVE_WORKERS,
+                               STAGE_INFERENCE_WORKERS, MULTI_SHOE_WORKERS, BATCH_DECODE_WORKERS,
+                               BATCH_REMBG_WORKERS, BATCH_ATTRIBUTE_WORKERS)
+
+# Read by OpenMP (torch, scikit-learn's KMeans, OpenCV builds using it) and the BLAS
+# libraries when they initialise, so these must be set before numpy/torch are imported
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                   "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+
+@dataclass(frozen=True)
+class ThreadBudget:
+    """
+    Thread counts for one serving process. match_workers requests run at once and
+    each native op inside them gets native_threads, so the product stays near cpus.
+    """
+    profile: str
+    cpus: int
+    match_workers: int
+    native_threads: int             # torch intra-op, OpenCV, OpenMP/BLAS
+    torch_interop_threads: int
+    rembg_intra_op_threads: int
+    rembg_inter_op_threads: int
+    model_onnx_intra_op_threads: int
+    model_onnx_inter_op_threads: int
+    stage_python_workers: int
+    stage_native_workers: int
+    stage_inference_workers: int
+    multi_shoe_workers: int         # per-shoe rembg and attributes in multi=true
+    batch_decode_workers: int       # /match/batch pipeline stages
+    batch_rembg_workers: int
+    batch_attribute_workers: int
+
+    def stage_workers(self) -> Dict[str, int]:
+        return {"python": self.stage_python_workers, "native": self.stage_native_workers,
+                "inference": self.stage_inference_workers}
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _latency(cpus: int) -> Dict[str, int]:
+    # A couple of requests at a time, each op spread over a share of the cores
+    match_workers = max(1, cpus // 4)
+    threads = max(1, cpus // match_workers)
+    return {
+        "match_workers": match_workers,
+        "native_threads": threads,
+        "rembg_intra_op_threads": threads,
+        "model_onnx_intra_op_threads": threads,
+        "stage_python_workers": match_workers,
+        "stage_native_workers": match_workers,
+        "stage_inference_workers": max(4, 2 * match_workers),
+        # Fan-out pools run multi-threaded ops too, so they get the same width as the match pool
+        "multi_shoe_workers": match_workers,
+        "batch_decode_workers": match_workers,
+        "batch_rembg_workers": match_workers,
+        "batch_attribute_workers": max(2, 2 * match_workers),
+    }
+
+
+def _throughput(cpus: int) -> Dict[str, int]:
+    # One request per core, every op single-threaded: no oversubscription, no idle cores under load
+    return {
+        "match_workers": cpus,
+        "native_threads": 1,
+        "rembg_intra_op_threads": 1,
+        "model_onnx_intra_op_threads": 1,
+        "stage_python_workers": max(2, cpus // 2),
+        "stage_native_workers": cpus,
+        "stage_inference_workers": max(4, 2 * cpus),
+        # Concurrent requests already fill the cores; these shared pools only bound the fan-out
+        "multi_shoe_workers": max(1, cpus // 2),
+        "batch_decode_workers": max(1, cpus // 4),
+        "batch_rembg_workers": max(1, cpus // 2),
+        "batch_attribute_workers": cpus,
+    }
+
+
+PROFILES = {"latency": _latency, "throughput": _throughput}
+
+
+def resolve(profile: str = THREAD_PROFILE, cpus: Optional[int] = None, workers: int = WORKERS) -> ThreadBudget:
+    """
+    Budget for one of `workers` pre-forked processes sharing `cpus` cores. Explicit
+    per-pool settings (non-zero SOCKMATCH_* values) override the profile.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown thread profile '{profile}'. Use {', '.join(PROFILES)}.")
+    cpus = max(1, (cpus or THREAD_BUDGET_CPUS or os.cpu_count() or 1) // max(1, workers))
+    values = PROFILES[profile](cpus)
+
+    overrides = {
+        "match_workers": MATCH_MAX_WORKERS,
+        "native_threads": WORKER_THREADS,
+        "rembg_intra_op_threads": REMBG_INTRA_OP_THREADS,
+        "model_onnx_intra_op_threads": MODEL_ONNX_INTRA_OP_THREADS,
+        "stage_python_workers": STAGE_PYTHON_WORKERS,
+        "stage_native_workers": STAGE_NATIVE_WORKERS,
+        "stage_inference_workers": STAGE_INFERENCE_WORKERS,
+        "multi_shoe_workers": MULTI_SHOE_WORKERS,
+        "batch_decode_workers": BATCH_DECODE_WORKERS,
+        "batch_rembg_workers": BATCH_REMBG_WORKERS,
+        "batch_attribute_workers": BATCH_ATTRIBUTE_WORKERS,
+    }
+    values.update({key: value for key, value in overrides.items() if value > 0})
+
+    return ThreadBudget(
+        profile=profile,
+        cpus=cpus,
+        torch_interop_threads=1,
+        rembg_inter_op_threads=max(1, REMBG_INTER_OP_THREADS),
+        model_onnx_inter_op_threads=max(1, MODEL_ONNX_INTER_OP_THREADS),
+        **values
+    )
+
+
+def apply_environment(threads: int):
+    """Export the OpenMP/BLAS thread counts; values already set in the environment win."""
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(threads))
+
+
+# Last counts given to apply_runtime, for libraries imported afterwards
+_applied: Optional[tuple] = None
+
+
+def apply_runtime(threads: int, interop_threads: int = 1):
+    """
+    Resize the thread pools of native libraries that are already loaded. torch is
+    left alone until something imports it (the ONNX backend never does); model
+    loaders call reapply_runtime() once they have imported it.
+    """
+    global _applied
+    _applied = (threads, interop_threads)
+    if "torch" in sys.modules:
+        torch = sys.modules["torch"]
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Only allowed before the first parallel op; the value from the first call stays
+            pass
+    if "cv2" in sys.modules:
+        sys.modules["cv2"].setNumThreads(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    # OpenMP and BLAS pools that were initialised before the environment was set
+    threadpool_limits(limits=threads)
+
+
+def reapply_runtime():
+    """Repeat the last apply_runtime() call, if any, after a loader imported torch or cv2."""
+    if _applied is not None:
+        apply_runtime(*_applied)
+
+
+# Resolved once at import; every pool and session is sized from this
+budget = resolve()
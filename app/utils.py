@@ -1,7 +1,9 @@
+import io
 import os
-import imghdr
+import zipfile
+from typing import List, Optional, Tuple
 from fastapi import UploadFile, HTTPException
-from app.config.config import ALLOWED_EXTENSIONS
+from app.config.config import ALLOWED_EXTENSIONS, MAX_UPLOAD_BYTES, BATCH_MAX_IMAGES
 
 def validate_uploaded_file(file: UploadFile, request_id: str):
     if not file.filename:
@@ -17,10 +19,69 @@ def validate_uploaded_file(file: UploadFile, request_id: str):
             detail={"request_id": request_id, "status": "error", "error": f"Unsupported file type {ext}. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"}
         )
 
-def verify_file_is_image(file_path: str, request_id: str):
-    if imghdr.what(file_path) is None:
-        os.remove(file_path)
+def sniff_image_type(data: bytes) -> Optional[str]:
+    """Identify the image format from its magic bytes (formats in ALLOWED_EXTENSIONS only)."""
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if data.startswith(b"BM"):
+        return "bmp"
+    if len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+def verify_image_bytes(data: bytes, request_id: str):
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail={"request_id": request_id, "status": "error", "error": f"Uploaded file exceeds {MAX_UPLOAD_BYTES} bytes."}
+        )
+
+    if sniff_image_type(data) is None:
         raise HTTPException(
             status_code=400,
             detail={"request_id": request_id, "status": "error", "error": "Uploaded file is not a valid image."}
         )
+
+def check_image_bytes(data: bytes) -> Optional[str]:
+    """Same checks as verify_image_bytes, returning the error message instead of raising."""
+    if len(data) > MAX_UPLOAD_BYTES:
+        return f"Uploaded file exceeds {MAX_UPLOAD_BYTES} bytes."
+    if sniff_image_type(data) is None:
+        return "Uploaded file is not a valid image."
+    return None
+
+def is_zip(data: bytes) -> bool:
+    return data.startswith(b"PK\x03\x04")
+
+def extract_zip_images(data: bytes, request_id: str) -> List[Tuple[str, bytes]]:
+    """
+    (filename, bytes) for every image in a zip archive, in archive order.
+    Members are read with the per-image size cap, so a zip bomb cannot
+    expand past MAX_UPLOAD_BYTES per entry.
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise HTTPException(
+            status_code=400,
+            detail={"request_id": request_id, "status": "error", "error": "Uploaded archive is not a valid zip file."}
+        )
+
+    images = []
+    with archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                continue
+            if os.path.splitext(name.lower())[1] not in ALLOWED_EXTENSIONS:
+                continue
+            if len(images) >= BATCH_MAX_IMAGES:
+                raise HTTPException(
+                    status_code=413,
+                    detail={"request_id": request_id, "status": "error", "error": f"Batch exceeds {BATCH_MAX_IMAGES} images."}
+                )
+            with archive.open(info) as member:
+                images.append((name, member.read(MAX_UPLOAD_BYTES + 1)))
+    return images
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from app.config.config import MATCH_MAX_QUEUE
+from app.thread_budget import budget
+
+
+class PoolSaturatedError(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class WorkerPool:
+    """
+    Bounded thread pool for the blocking matching pipeline.
+    At most max_workers jobs run at once and at most max_queue wait for a
+    worker; anything beyond that is rejected immediately so callers can
+    shed load instead of queueing without limit.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, name: str = "match-worker"):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self.submit(fn, *args, **kwargs)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> "asyncio.Future":
+        """
+        Admit a job and return an awaitable for its result. Raises
+        PoolSaturatedError right away, before the caller commits to a response.
+        Must be called from the event loop.
+        """
+        with self._lock:
+            if self._queued + self._in_flight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise PoolSaturatedError(
+                    f"{self._in_flight} jobs running and {self._queued} queued (limit {self.max_queue})"
+                )
+            self._queued += 1
+
+        def job():
+            with self._lock:
+                self._queued -= 1
+                self._in_flight += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._completed += 1
+
+        future = self._executor.submit(job)
+        # A job cancelled before it started never ran job(), so release its queue slot here.
+        future.add_done_callback(self._release_if_cancelled)
+        return asyncio.wrap_future(future)
+
+    def _release_if_cancelled(self, future):
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": self._queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+
+# Shared pool for the /match pipeline
+match_pool = WorkerPool(budget.match_workers, MATCH_MAX_QUEUE)
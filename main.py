@@ -1,11 +1,17 @@
 import os
 import uvicorn
 from app.app import app
+from app.config.config import WORKERS
 import psutil
 process = psutil.Process(os.getpid())
 mem = process.memory_info().rss / 1024 / 1024
 print(f"[BASE MEMORY] Process is using: {mem:.2f} MB at startup.")
+print("[BASE MEMORY] Models load in parallel once the server starts; see [MODEL MEMORY] lines and GET /readyz.")
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))  # Railway sets PORT env var
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    if WORKERS > 1:
+        from app.serving import serve_prefork
+        serve_prefork(app, host="0.0.0.0", port=port, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,92 @@
+import glob
+import mimetypes
+import os
+import resource
+import sys
+import uuid
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Images that ship with the repo and are used as the default benchmark set
+DEFAULT_IMAGE_GLOBS = [
+    os.path.join("model", "*.jpg"),
+    os.path.join("model", "*.jpeg"),
+    os.path.join("results", "*.png"),
+    os.path.join("results", "*.jpg"),
+]
+
+
+def default_image_paths() -> List[str]:
+    paths = []
+    for pattern in DEFAULT_IMAGE_GLOBS:
+        paths.extend(sorted(glob.glob(os.path.join(REPO_ROOT, pattern))))
+    return paths
+
+
+def collect_image_paths(inputs: Sequence[str]) -> List[str]:
+    """Expand files and directories given on the command line; fall back to the repo images."""
+    if not inputs:
+        return default_image_paths()
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for ext in ("*.jpg", "*.jpeg", "*.png", "*.bmp", "*.webp"):
+                paths.extend(sorted(glob.glob(os.path.join(item, ext))))
+        else:
+            paths.append(item)
+    return paths
+
+
+def latency_summary(samples_s: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean in milliseconds for a list of durations in seconds."""
+    if not samples_s:
+        return {"count": 0}
+    ms = np.asarray(samples_s) * 1000.0
+    return {
+        "count": int(ms.size),
+        "mean_ms": round(float(ms.mean()), 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (Linux reports KiB, macOS bytes)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def print_table(rows: List[Dict], columns: Sequence[str]):
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(str(r.get(c, "")).ljust(widths[c]) for c in columns))
+
+
+def multipart_body(field: str, path: str) -> Tuple[bytes, str]:
+    """Encode one file as multipart/form-data; returns (body, content_type)."""
+    boundary = uuid.uuid4().hex
+    filename = os.path.basename(path)
+    mime = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    with open(path, "rb") as f:
+        data = f.read()
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: {mime}\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def api_headers(content_type: str) -> Dict[str, str]:
+    """Headers accepted by app.security.verify_request (API key from SOCKMATCH_API_KEY)."""
+    return {
+        "Authorization": f"Bearer {os.getenv('SOCKMATCH_API_KEY', '')}",
+        "X-Client-Source": "sock-match-ai",
+        "X-Request-ID": f"bench-{uuid.uuid4().hex[:8]}",
+        "Content-Type": content_type,
+    }
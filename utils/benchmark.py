@@ -0,0 +1,256 @@
+"""
+Offline benchmark of the matching pipeline.
+
+Drives SockRecommender.match_socks end to end and each stage of
+image_preprocessing on its own over a local image set (the repo images by
+default, plus synthetic resized variants), then reports p50/p95/p99
+latency per stage, match_socks throughput at several concurrency levels
+and peak RSS. The result cache is disabled unless --with-cache is given,
+so repeated runs measure real work. Run from the repo root:
+
+    python -m utils.benchmark --scales 0.5 1 2 --runs 5 --json bench.json
+    python -m utils.benchmark --json new.json --baseline bench.json --max-regression 0.15
+
+With --baseline the run is compared against an earlier JSON file and the
+command exits with status 1 if any latency grew, or throughput dropped,
+by more than the allowed fraction.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from utils.bench_utils import REPO_ROOT, collect_image_paths, latency_summary, peak_rss_mb, print_table
+
+# Stages in pipeline order; "recommend" is safe_label + StyleMatcher.match + response building
+STAGES = ["decode", "yolo", "rembg", "extract_colors", "shape_features",
+          "predict_model_properties", "recommend"]
+
+
+def make_variants(paths: List[str], scales: List[float], out_dir: str) -> List[str]:
+    """Write resized copies of each image (same format) and return originals plus variants."""
+    variants = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            print(f"Skipping unreadable image {path}")
+            continue
+        for scale in scales:
+            if scale == 1.0:
+                variants.append(path)
+                continue
+            size = (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale)))
+            resized = cv2.resize(image, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+            name, ext = os.path.splitext(os.path.basename(path))
+            out = os.path.join(out_dir, f"{name}@{scale:g}x{ext}")
+            cv2.imwrite(out, resized)
+            variants.append(out)
+    return variants
+
+
+def time_call(samples: Dict[str, List[float]], stage: str, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    samples[stage].append(time.perf_counter() - started)
+    return result
+
+
+def bench_stages(paths: List[str], runs: int) -> Dict[str, Dict]:
+    """Time every stage on its own, feeding each stage the previous stage's output."""
+    from app.match_logic import image_preprocessing as ip
+    from app.match_logic.matcher import get_recommender
+
+    recommender = get_recommender()
+    samples = {stage: [] for stage in STAGES}
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        for _ in range(runs):
+            image = time_call(samples, "decode", ip.decode_image, data)
+            detections = time_call(samples, "yolo", ip.detect_shoes, [image])[0]
+            # Pre-cropped images may not be detected; use the whole frame so later stages still run
+            detections = detections or [ip.Detection((0, 0, image.shape[1], image.shape[0]))]
+            try:
+                rgba = time_call(samples, "rembg", ip.remove_shoe_background, image, detections)
+            except ValueError as e:
+                print(f"{os.path.basename(path)}: {e}")
+                break
+            height, design = time_call(samples, "shape_features", ip.analyse_shape, rgba)
+            attributes = {
+                "colors": time_call(samples, "extract_colors", ip.extract_colors, rgba, 3),
+                "height": height,
+                "design": design,
+                "model_properties": time_call(samples, "predict_model_properties", ip.predict_model_properties, rgba),
+                "error": None,
+            }
+            time_call(samples, "recommend", recommender.recommend, attributes)
+    return {stage: latency_summary(values) for stage, values in samples.items()}
+
+
+def bench_throughput(paths: List[str], concurrency_levels: List[int], requests: int, seed: int) -> List[Dict]:
+    """match_socks latency and requests/second with N concurrent callers."""
+    from app.match_logic.matcher import get_recommender
+
+    recommender = get_recommender()
+    rng = np.random.default_rng(seed)
+    rows = []
+    for concurrency in concurrency_levels:
+        workload = [paths[i] for i in rng.integers(0, len(paths), size=requests)]
+        latencies, errors = [], 0
+
+        def one(path):
+            started = time.perf_counter()
+            result = recommender.match_socks(path)
+            return time.perf_counter() - started, result.get("error") is not None
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for elapsed, failed in pool.map(one, workload):
+                latencies.append(elapsed)
+                errors += failed
+        wall = time.perf_counter() - started
+
+        rows.append({
+            "concurrency": concurrency,
+            "requests": requests,
+            "errors": errors,
+            "throughput_rps": round(requests / wall, 3),
+            **latency_summary(latencies),
+        })
+    return rows
+
+
+def run_metadata(args) -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {k: v for k, v in sorted(os.environ.items()) if k.startswith("SOCKMATCH_") and k != "SOCKMATCH_API_KEY"},
+        "args": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")},
+    }
+
+
+def compare(current: Dict, baseline: Dict, max_regression: float, min_delta_ms: float) -> List[Dict]:
+    """
+    One row per compared metric. Latency (p50/p95) regresses when it grows by
+    more than max_regression and min_delta_ms; throughput when it drops by more
+    than max_regression; peak RSS when it grows by more than max_regression.
+    """
+    rows = []
+
+    def add(metric, old, new, higher_is_worse, absolute_floor=0.0):
+        if old is None or new is None or old <= 0:
+            return
+        change = (new - old) / old
+        worse = change if higher_is_worse else -change
+        regressed = worse > max_regression and abs(new - old) > absolute_floor
+        rows.append({"metric": metric, "baseline": old, "current": new,
+                     "change": f"{change * 100:+.1f}%", "regressed": regressed})
+
+    for stage, summary in current.get("stages", {}).items():
+        old = baseline.get("stages", {}).get(stage, {})
+        for key in ("p50_ms", "p95_ms"):
+            add(f"{stage}.{key}", old.get(key), summary.get(key), True, min_delta_ms)
+
+    old_throughput = {r["concurrency"]: r for r in baseline.get("throughput", [])}
+    for row in current.get("throughput", []):
+        old = old_throughput.get(row["concurrency"])
+        if old:
+            add(f"match_socks@{row['concurrency']}.throughput_rps", old["throughput_rps"], row["throughput_rps"], False)
+            add(f"match_socks@{row['concurrency']}.p95_ms", old.get("p95_ms"), row.get("p95_ms"), True, min_delta_ms)
+
+    add("peak_rss_mb", baseline.get("peak_rss_mb"), current.get("peak_rss_mb"), True)
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files or folders (defaults to the repo sample images)")
+    parser.add_argument("--scales", nargs="+", type=float, default=[0.5, 1.0, 2.0],
+                        help="Synthetic resized variants of each image (1 = original)")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per image for the stage benchmark")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=0,
+                        help="match_socks calls per concurrency level (default: 2 per image)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the request order")
+    parser.add_argument("--skip-stages", action="store_true", help="Only run the throughput benchmark")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the result cache enabled")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Compare against an earlier --json file")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Allowed fractional latency growth / throughput drop (default 0.10)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="Ignore latency changes smaller than this, whatever the percentage")
+    args = parser.parse_args(argv)
+
+    # Must be set before the app modules read their configuration
+    if not args.with_cache:
+        os.environ["SOCKMATCH_RESULT_CACHE"] = "0"
+    from app.match_logic.model_registry import registry
+    from app.match_logic.matcher import get_recommender
+
+    sources = collect_image_paths(args.images)
+    if not sources:
+        parser.error("no images found")
+
+    with tempfile.TemporaryDirectory(prefix="sockmatch-bench-") as tmp:
+        paths = make_variants(sources, args.scales, tmp)
+        print(f"{len(sources)} images, {len(paths)} with variants")
+
+        started = time.perf_counter()
+        registry.load_all()
+        print(f"Models ready in {time.perf_counter() - started:.2f}s")
+        get_recommender().match_socks(paths[0])  # first-call costs stay out of the numbers
+
+        results = {"meta": run_metadata(args), "images": len(paths)}
+        if not args.skip_stages:
+            results["stages"] = bench_stages(paths, args.runs)
+            print_table([{"stage": s, **v} for s, v in results["stages"].items()],
+                        ["stage", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+            print()
+
+        requests = args.requests or 2 * len(paths)
+        results["throughput"] = bench_throughput(paths, args.concurrency, requests, args.seed)
+        print_table(results["throughput"], list(results["throughput"][0].keys()))
+
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    print(f"\nPeak RSS: {results['peak_rss_mb']} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.max_regression, args.min_delta_ms)
+        print(f"\nCompared with {args.baseline} (commit {baseline.get('meta', {}).get('git_commit')}):")
+        if rows:
+            print_table(rows, ["metric", "baseline", "current", "change", "regressed"])
+        regressions = [r["metric"] for r in rows if r["regressed"]]
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.max_regression:.0%}: {', '.join(regressions)}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.max_regression:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
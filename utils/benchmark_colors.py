@@ -0,0 +1,107 @@
+"""
+Benchmark colour-extraction strategies against the original full-pixel KMeans.
+
+For every image (RGBA crops, or opaque images treated as fully visible)
+each strategy is timed and its colour names compared with the "kmeans"
+reference. Agreement is reported as the share of images whose dominant
+reference colour is the strategy's primary colour, and as the mean Jaccard
+overlap of the colour-name sets. "kmeans" keeps the original, unordered
+cluster output, so only its set overlap is reported. Run from the repo root:
+
+    python -m utils.benchmark_colors --scales 1 2 4 --runs 3
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+from sklearn.cluster import KMeans
+
+from app.match_logic import color_extraction
+from utils.bench_utils import collect_image_paths, latency_summary, print_table
+
+
+def load_rgba(path: str) -> np.ndarray:
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise FileNotFoundError(path)
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    if image.shape[2] == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+    return cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA)
+
+
+def reference_colors(rgba: np.ndarray, num_colors: int):
+    """Original KMeans names, ordered by cluster population so the dominant colour is first."""
+    hsv = color_extraction.opaque_hsv_pixels(rgba)
+    if hsv is None:
+        return ["unknown"]
+    kmeans = KMeans(n_clusters=num_colors, n_init=20, random_state=0)
+    labels = kmeans.fit_predict(hsv)
+    return color_extraction.names_by_population(kmeans.cluster_centers_, labels, num_colors)
+
+
+# Strategies that return names in cluster order rather than most populous first;
+# comparing their first name with the reference's dominant colour would be meaningless
+UNORDERED_STRATEGIES = {"kmeans"}
+
+
+def jaccard(a, b) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files or folders (defaults to the repo sample images)")
+    parser.add_argument("--strategies", nargs="+", default=list(color_extraction.STRATEGIES),
+                        choices=color_extraction.STRATEGIES)
+    parser.add_argument("--scales", nargs="+", type=float, default=[1.0],
+                        help="Also benchmark synthetic resized variants of each image")
+    parser.add_argument("--num-colors", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per image and strategy")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    crops = []
+    for path in collect_image_paths(args.images):
+        rgba = load_rgba(path)
+        for scale in args.scales:
+            if scale != 1.0:
+                size = (max(1, int(rgba.shape[1] * scale)), max(1, int(rgba.shape[0] * scale)))
+                crops.append(cv2.resize(rgba, size, interpolation=cv2.INTER_LINEAR))
+            else:
+                crops.append(rgba)
+    if not crops:
+        parser.error("no images found")
+
+    references = [reference_colors(rgba, args.num_colors) for rgba in crops]
+
+    rows = []
+    for strategy in args.strategies:
+        samples, primary_hits, overlaps = [], 0, []
+        for rgba, reference in zip(crops, references):
+            for _ in range(args.runs):
+                t0 = time.perf_counter()
+                names = color_extraction.extract_colors(rgba, args.num_colors, strategy=strategy)
+                samples.append(time.perf_counter() - t0)
+            primary_hits += names[0] == reference[0]
+            overlaps.append(jaccard(names, reference))
+        rows.append({
+            "strategy": strategy,
+            **latency_summary(samples),
+            "primary_agreement": "n/a" if strategy in UNORDERED_STRATEGIES else round(primary_hits / len(crops), 3),
+            "mean_set_jaccard": round(float(np.mean(overlaps)), 3),
+        })
+
+    print(f"{len(crops)} crops, up to {max(c.shape[0] * c.shape[1] for c in crops)} pixels")
+    print_table(rows, list(rows[0].keys()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"crops": len(crops), "runs": args.runs, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
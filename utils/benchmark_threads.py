@@ -0,0 +1,85 @@
+"""
+Compare the CPU thread profiles (SOCKMATCH_THREAD_PROFILE) under load.
+
+For each profile this starts `python main.py` with that profile, waits for
+/readyz, reads the resolved thread budget from /status, and drives POST /match
+at each client concurrency. A single client shows the latency a lone request
+gets; more clients than cores show where each profile saturates. Requires
+SOCKMATCH_API_KEY to be set. Run from the repo root:
+
+    python -m utils.benchmark_threads --profiles latency throughput --concurrency 1 4 16 --duration 30
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import urllib.request
+
+from utils.bench_utils import REPO_ROOT, collect_image_paths, latency_summary, multipart_body, print_table
+from utils.benchmark_workers import drive, free_port, wait_ready
+
+
+def thread_budget(base_url: str) -> dict:
+    with urllib.request.urlopen(f"{base_url}/status", timeout=10) as resp:
+        return json.load(resp).get("thread_budget", {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files or folders (defaults to the repo sample images)")
+    parser.add_argument("--profiles", nargs="+", default=["latency", "throughput"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, os.cpu_count() or 1, 2 * (os.cpu_count() or 1)])
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load per concurrency level")
+    parser.add_argument("--workers", type=int, default=1, help="Pre-forked worker processes (SOCKMATCH_WORKERS)")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    bodies = [multipart_body("file", p) for p in collect_image_paths(args.images)]
+    if not bodies:
+        parser.error("no images found")
+
+    rows, budgets = [], {}
+    for profile in args.profiles:
+        port = free_port()
+        env = dict(os.environ, SOCKMATCH_THREAD_PROFILE=profile, SOCKMATCH_WORKERS=str(args.workers), PORT=str(port))
+        # The result cache would turn repeated images into cache hits
+        env["SOCKMATCH_RESULT_CACHE"] = "false"
+        server = subprocess.Popen([sys.executable, "main.py"], cwd=REPO_ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            if not wait_ready(base_url, args.workers, args.startup_timeout):
+                rows.append({"profile": profile, "error": "not ready"})
+                continue
+            budgets[profile] = budget = thread_budget(base_url)
+            for concurrency in args.concurrency:
+                latencies, errors, elapsed = drive(base_url, bodies, concurrency, args.duration)
+                summary = latency_summary(latencies)
+                rows.append({
+                    "profile": profile,
+                    "match_workers": budget.get("match_workers"),
+                    "native_threads": budget.get("native_threads"),
+                    "clients": concurrency,
+                    "req_per_s": round(len(latencies) / elapsed, 2),
+                    "p50_ms": summary.get("p50_ms"),
+                    "p95_ms": summary.get("p95_ms"),
+                    "p99_ms": summary.get("p99_ms"),
+                    "errors": errors,
+                })
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    print_table(rows, list(dict.fromkeys(k for r in rows for k in r)))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"budgets": budgets, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Measure memory and throughput of pre-fork serving as the worker count grows.
+
+For each worker count this starts `python main.py` with SOCKMATCH_WORKERS=N,
+waits for /readyz, records total RSS and PSS (proportional set size, which
+splits shared copy-on-write pages fairly between processes) across the
+process tree, then drives POST /match with concurrent clients. Requires
+SOCKMATCH_API_KEY to be set. Run from the repo root:
+
+    python -m utils.benchmark_workers --workers 1 2 4 --duration 30
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import psutil
+
+from utils.bench_utils import REPO_ROOT, api_headers, collect_image_paths, latency_summary, multipart_body, print_table
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(base_url: str, workers: int, timeout: float) -> bool:
+    # Any one worker answers each probe, so require several ready answers in a row
+    deadline, streak = time.monotonic() + timeout, 0
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/readyz", timeout=5) as resp:
+                streak = streak + 1 if resp.status == 200 else 0
+        except (urllib.error.URLError, ConnectionError, OSError):
+            streak = 0
+        if streak >= workers * 3:
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def tree_memory_mb(pid: int):
+    parent = psutil.Process(pid)
+    rss = pss = 0
+    for proc in [parent] + parent.children(recursive=True):
+        try:
+            info = proc.memory_full_info()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        rss += info.rss
+        pss += getattr(info, "pss", info.rss)
+    return round(rss / 1024 / 1024, 1), round(pss / 1024 / 1024, 1)
+
+
+def drive(base_url: str, bodies, concurrency: int, duration: float):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(offset: int):
+        nonlocal errors
+        i = offset
+        while time.monotonic() < stop_at:
+            body, content_type = bodies[i % len(bodies)]
+            i += 1
+            request = urllib.request.Request(f"{base_url}/match", data=body, headers=api_headers(content_type))
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=120) as resp:
+                    resp.read()
+                ok = True
+            except (urllib.error.URLError, OSError):
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - t0)
+                else:
+                    errors += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files or folders (defaults to the repo sample images)")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--concurrency-per-worker", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load per worker count")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    bodies = [multipart_body("file", p) for p in collect_image_paths(args.images)]
+    if not bodies:
+        parser.error("no images found")
+
+    rows = []
+    for workers in args.workers:
+        port = free_port()
+        env = dict(os.environ, SOCKMATCH_WORKERS=str(workers), PORT=str(port))
+        server = subprocess.Popen([sys.executable, "main.py"], cwd=REPO_ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            if not wait_ready(base_url, workers, args.startup_timeout):
+                rows.append({"workers": workers, "error": "not ready"})
+                continue
+            idle_rss, idle_pss = tree_memory_mb(server.pid)
+            latencies, errors, elapsed = drive(base_url, bodies, workers * args.concurrency_per_worker, args.duration)
+            loaded_rss, loaded_pss = tree_memory_mb(server.pid)
+            summary = latency_summary(latencies)
+            rows.append({
+                "workers": workers,
+                "idle_rss_mb": idle_rss,
+                "idle_pss_mb": idle_pss,
+                "loaded_rss_mb": loaded_rss,
+                "loaded_pss_mb": loaded_pss,
+                "req_per_s": round(len(latencies) / elapsed, 2),
+                "p50_ms": summary.get("p50_ms"),
+                "p95_ms": summary.get("p95_ms"),
+                "errors": errors,
+            })
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    print_table(rows, list(dict.fromkeys(k for r in rows for k in r)))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
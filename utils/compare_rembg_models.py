@@ -0,0 +1,78 @@
+"""
+Compare rembg background-removal models on local images.
+
+Reports per-model latency and mask agreement (IoU of the alpha masks)
+against a reference model, so the lighter model can be chosen on purpose. Run from the repo root:
+
+    python -m utils.compare_rembg_models --models u2net u2netp silueta isnet --runs 3
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.match_logic.background_removal import SUPPORTED_MODELS, create_session, remove_background, warm_up
+from utils.bench_utils import collect_image_paths, latency_summary, print_table
+
+
+def mask_of(rgba: Image.Image) -> np.ndarray:
+    return np.asarray(rgba)[:, :, 3] > 127
+
+
+def iou(a: np.ndarray, b: np.ndarray) -> float:
+    union = np.logical_or(a, b).sum()
+    return float(np.logical_and(a, b).sum() / union) if union else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files or folders (defaults to the repo sample images)")
+    parser.add_argument("--models", nargs="+", default=list(SUPPORTED_MODELS), choices=list(SUPPORTED_MODELS))
+    parser.add_argument("--reference", default="u2net", choices=list(SUPPORTED_MODELS))
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per image")
+    parser.add_argument("--intra-op-threads", type=int, default=2)
+    parser.add_argument("--inter-op-threads", type=int, default=1)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    images = [Image.open(p).convert("RGB") for p in collect_image_paths(args.images)]
+    if not images:
+        parser.error("no images found")
+
+    models = list(dict.fromkeys([args.reference] + args.models))
+    masks = {}
+    rows = []
+    for model in models:
+        started = time.perf_counter()
+        session = create_session(model, args.intra_op_threads, args.inter_op_threads)
+        load_s = time.perf_counter() - started
+        warm_up(session)
+
+        samples = []
+        masks[model] = []
+        for image in images:
+            for _ in range(args.runs):
+                t0 = time.perf_counter()
+                rgba = remove_background(image, session=session)
+                samples.append(time.perf_counter() - t0)
+            masks[model].append(mask_of(rgba))
+
+        ious = [iou(m, r) for m, r in zip(masks[model], masks[args.reference])]
+        rows.append({
+            "model": model,
+            "load_s": round(load_s, 2),
+            **latency_summary(samples),
+            f"mean_iou_vs_{args.reference}": round(float(np.mean(ious)), 3),
+            f"min_iou_vs_{args.reference}": round(float(np.min(ious)), 3),
+        })
+
+    print_table(rows, list(rows[0].keys()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"images": len(images), "runs": args.runs, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
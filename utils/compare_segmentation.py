@@ -0,0 +1,148 @@
+"""
+Compare the two ways of getting the shoe mask on local images:
+- rembg: YOLO box (model/model.pt), then rembg on the crop (two networks)
+- detector: the mask from an ultralytics -seg checkpoint (one network)
+
+For every image both full-frame masks are built at the original resolution
+and compared by IoU. The per-path latency (detection + mask) is reported,
+along with how often colours, height and design computed from the two RGBA
+crops agree. Run from the repo root:
+
+    python -m utils.compare_segmentation --seg-model model/model-seg.pt --runs 3
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.config.config import SEG_MODEL_PATH
+from app.match_logic import image_preprocessing as ip
+from app.match_logic.background_removal import remove_background, warm_up, create_session
+from app.match_logic.segmentation import polygon_mask
+from utils.bench_utils import collect_image_paths, latency_summary, print_table
+
+
+def first_detection(result, confidence_threshold: float):
+    for i, d in enumerate(result.boxes):
+        if d.conf >= confidence_threshold:
+            box = tuple(map(int, d.xyxy[0]))
+            polygon = result.masks.xy[i] if result.masks is not None else None
+            return box, polygon
+    return None, None
+
+
+def rembg_path(model, session, image: np.ndarray, confidence_threshold: float):
+    """Full-frame mask and RGBA crop from YOLO + rembg"""
+    box, _ = first_detection(model(image, verbose=False)[0], confidence_threshold)
+    if box is None:
+        return None, None
+    x1, y1, x2, y2 = box
+    crop = Image.fromarray(cv2.cvtColor(image[y1:y2, x1:x2], cv2.COLOR_BGR2RGB))
+    rgba = np.array(remove_background(crop, session=session))
+    mask = np.zeros(image.shape[:2], dtype=bool)
+    mask[y1:y2, x1:x2] = rgba[:, :, 3] > 127
+    return mask, rgba
+
+
+def detector_path(model, image: np.ndarray, confidence_threshold: float):
+    """Full-frame mask and RGBA crop from the -seg model's polygon"""
+    box, polygon = first_detection(model(image, verbose=False)[0], confidence_threshold)
+    if box is None or polygon is None:
+        return None, None
+    full = polygon_mask(image.shape, polygon)
+    x1, y1, x2, y2 = box
+    rgba = cv2.cvtColor(image[y1:y2, x1:x2], cv2.COLOR_BGR2RGBA)
+    alpha = full[y1:y2, x1:x2]
+    rgba[alpha == 0] = 0
+    rgba[:, :, 3] = alpha
+    return full > 0, rgba
+
+
+def iou(a: np.ndarray, b: np.ndarray) -> float:
+    union = np.logical_or(a, b).sum()
+    return float(np.logical_and(a, b).sum() / union) if union else 1.0
+
+
+def attributes(rgba: np.ndarray):
+    return (ip.extract_colors(rgba, 3), *ip.analyse_shape(rgba))
+
+
+def timed_run(fn, runs: int, *args):
+    samples, result = [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn(*args)
+        samples.append(time.perf_counter() - started)
+    return result, samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files or folders (defaults to the repo sample images)")
+    parser.add_argument("--seg-model", default=SEG_MODEL_PATH, help="Ultralytics -seg checkpoint")
+    parser.add_argument("--confidence", type=float, default=0.5)
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per image and path")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    paths = collect_image_paths(args.images)
+    if not paths:
+        parser.error("no images found")
+
+    detector = ip._load_yolo(ip.yolo_model_path)
+    segmenter = ip._load_yolo(args.seg_model)
+    session = create_session()
+    for model in (detector, segmenter):
+        ip._warm_up_yolo(model)
+    warm_up(session)
+
+    rows, timings = [], {"rembg": [], "detector": []}
+    agreement = {"colors_primary": [], "height": [], "design": []}
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Skipping unreadable image {path}")
+            continue
+
+        (rembg_mask, rembg_rgba), samples = timed_run(rembg_path, args.runs, detector, session, image, args.confidence)
+        timings["rembg"].extend(samples)
+        (seg_mask, seg_rgba), samples = timed_run(detector_path, args.runs, segmenter, image, args.confidence)
+        timings["detector"].extend(samples)
+
+        row = {"image": os.path.basename(path)}
+        if rembg_mask is None or seg_mask is None:
+            row["iou"] = "no shoe (rembg)" if rembg_mask is None else "no mask (detector)"
+        else:
+            row["iou"] = round(iou(rembg_mask, seg_mask), 3)
+            (c1, h1, d1), (c2, h2, d2) = attributes(rembg_rgba), attributes(seg_rgba)
+            agreement["colors_primary"].append(c1[:1] == c2[:1])
+            agreement["height"].append(h1 == h2)
+            agreement["design"].append(d1 == d2)
+            row.update({"rembg": f"{c1[0]}/{h1}/{d1}", "detector": f"{c2[0]}/{h2}/{d2}"})
+        rows.append(row)
+
+    print_table(rows, ["image", "iou", "rembg", "detector"])
+    print()
+    latency_rows = [{"path": name, **latency_summary(samples)} for name, samples in timings.items()]
+    print_table(latency_rows, list(latency_rows[0].keys()))
+
+    ious = [r["iou"] for r in rows if isinstance(r["iou"], float)]
+    summary = {
+        "mean_iou": round(float(np.mean(ious)), 3) if ious else None,
+        "min_iou": round(float(np.min(ious)), 3) if ious else None,
+        **{f"{k}_agreement": round(float(np.mean(v)), 3) if v else None for k, v in agreement.items()},
+    }
+    print()
+    print(", ".join(f"{k}={v}" for k, v in summary.items()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"images": rows, "latency": latency_rows, "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
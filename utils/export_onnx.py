@@ -0,0 +1,145 @@
+"""
+Export best_shoe_model.pth to ONNX and check parity with the torch model.
+
+Writes model/best_shoe_model.onnx (one named output per head plus the 512-d
+backbone "features", dynamic batch axis) and model/best_shoe_model.labels.json (columns and label classes), then
+runs both backends on local images and fails if any predicted label differs
+or a confidence drifts by more than --tolerance. Run from the repo root:
+
+    python -m utils.export_onnx --tolerance 0.5
+    SOCKMATCH_MODEL_BACKEND=onnx python main.py
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+
+from app.match_logic.shoe_model_onnx import OnnxBackend, FEATURES_OUTPUT
+from app.match_logic.shoe_model_prediction import model_path, onnx_model_path, onnx_labels_path, preprocess_crop
+from app.match_logic.shoe_model_torch import TorchBackend
+from utils.bench_utils import collect_image_paths, latency_summary, print_table
+
+
+class _HeadsAsTuple(nn.Module):
+    """ONNX export wrapper: returns the heads in column order, then the backbone features, instead of a dict."""
+
+    def __init__(self, model: nn.Module, columns):
+        super().__init__()
+        self.model = model
+        self.columns = list(columns)
+
+    def forward(self, x):
+        outputs, features = self.model(x, return_features=True)
+        return (*(outputs[col] for col in self.columns), features)
+
+
+def export(torch_backend: TorchBackend, onnx_path: str, labels_path: str, opset: int):
+    columns = list(torch_backend.columns)
+    dummy = torch.zeros(1, 3, 224, 224, dtype=torch.float32)
+    torch.onnx.export(
+        _HeadsAsTuple(torch_backend.model, columns).eval(),
+        dummy,
+        onnx_path,
+        input_names=["input"],
+        output_names=columns + [FEATURES_OUTPUT],
+        dynamic_axes={"input": {0: "batch"}, **{name: {0: "batch"} for name in columns + [FEATURES_OUTPUT]}},
+        opset_version=opset,
+        do_constant_folding=True,
+    )
+    with open(labels_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "columns": columns,
+            "classes": {col: torch_backend.classes[col].tolist() for col in columns},
+        }, f, indent=2)
+
+
+def load_crops(paths):
+    # Preprocess as the service does; RGB images are treated as fully opaque crops
+    crops = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is not None:
+            rgba = cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+            crops.append(preprocess_crop(rgba))
+    return crops
+
+
+def compare(torch_backend, onnx_backend, crops, runs: int):
+    """
+    Per-head label agreement, max confidence drift (percentage points), the max
+    cosine distance between the two backends' embeddings, and latency for both.
+    """
+    batch = np.stack(crops).astype(np.float32)
+    timings = {"torch": [], "onnx": []}
+    for _ in range(runs):
+        for name, backend in (("torch", torch_backend), ("onnx", onnx_backend)):
+            t0 = time.perf_counter()
+            probs, features = backend.run_with_features(batch)
+            timings[name].append(time.perf_counter() - t0)
+            if name == "torch":
+                torch_probs, torch_features = probs, features
+            else:
+                onnx_probs, onnx_features = probs, features
+
+    unit = lambda f: f / np.maximum(np.linalg.norm(f, axis=1, keepdims=True), 1e-12)
+    feature_drift = float((1.0 - (unit(torch_features) * unit(onnx_features)).sum(axis=1)).max())
+
+    heads = []
+    for col in torch_backend.columns:
+        t_idx, o_idx = torch_probs[col].argmax(1), onnx_probs[col].argmax(1)
+        rows = np.arange(len(crops))
+        drift = np.abs(torch_probs[col][rows, t_idx] - onnx_probs[col][rows, o_idx]) * 100
+        heads.append({
+            "head": col,
+            "label_agreement": round(float((t_idx == o_idx).mean()), 4),
+            "max_confidence_drift_pp": round(float(drift.max()), 4),
+        })
+    return heads, feature_drift, {name: latency_summary(samples) for name, samples in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Images for the parity check (defaults to the repo sample images)")
+    parser.add_argument("--checkpoint", default=model_path)
+    parser.add_argument("--output", default=onnx_model_path)
+    parser.add_argument("--labels", default=onnx_labels_path)
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Max confidence drift in percentage points")
+    parser.add_argument("--feature-tolerance", type=float, default=1e-3, help="Max cosine distance between embeddings")
+    parser.add_argument("--runs", type=int, default=5, help="Timed batch runs per backend")
+    parser.add_argument("--skip-check", action="store_true")
+    args = parser.parse_args()
+
+    torch_backend = TorchBackend(args.checkpoint)
+    export(torch_backend, args.output, args.labels, args.opset)
+    print(f"✅ Exported {args.output} and {args.labels}")
+    if args.skip_check:
+        return
+
+    crops = load_crops(collect_image_paths(args.images))
+    if not crops:
+        sys.exit("❌ No images for the parity check")
+
+    onnx_backend = OnnxBackend(args.output, args.labels)
+    heads, feature_drift, latency = compare(torch_backend, onnx_backend, crops, args.runs)
+    print_table(heads, list(heads[0].keys()))
+    print(f"features: max cosine distance {feature_drift:.6f}")
+    for name, summary in latency.items():
+        print(f"{name}: batch of {len(crops)} -> {summary}")
+
+    failed = [h["head"] for h in heads
+              if h["label_agreement"] < 1.0 or h["max_confidence_drift_pp"] > args.tolerance]
+    if feature_drift > args.feature_tolerance:
+        failed.append(FEATURES_OUTPUT)
+    if failed:
+        sys.exit(f"❌ Parity check failed for: {', '.join(failed)}")
+    print("✅ ONNX outputs match the torch model")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Compare the INT8 attribute model against float32 on a local image folder.
+
+Reports per-head top-1 agreement with the float model, confidence drift
+(percentage points of the reported confidence), single-image and batched
+latency, and serialized model size, so SOCKMATCH_MODEL_PRECISION=int8 can
+be chosen with real numbers. The backbone is calibrated on a separate
+folder of background-removed shoe crops: --calibration-dir is required
+unless SOCKMATCH_MODEL_CALIBRATION_DIR is set, since the repo ships none.
+Scored images are always held out of calibration, and the report lists
+which images were used for each. Run from the repo root:
+
+    python -m utils.quantization_report path/to/shoe/crops --calibration-dir path/to/calibration
+"""
+import argparse
+import io
+import json
+import os
+import time
+
+import numpy as np
+import torch
+
+from app.config.config import MODEL_CALIBRATION_DIR
+from app.match_logic.shoe_model_prediction import model_path
+from app.match_logic.shoe_model_torch import TorchBackend
+from utils.bench_utils import collect_image_paths, latency_summary, print_table
+from utils.export_onnx import load_crops
+
+
+def model_size_mb(model: torch.nn.Module) -> float:
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return round(buffer.tell() / (1024 * 1024), 2)
+
+
+def time_backend(backend: TorchBackend, crops, runs: int):
+    batch = np.stack(crops).astype(np.float32)
+    single, batched = [], []
+    for _ in range(runs):
+        for crop in crops:
+            t0 = time.perf_counter()
+            backend.run(crop[None])
+            single.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        probs = backend.run(batch)
+        batched.append(time.perf_counter() - t0)
+    return probs, latency_summary(single), latency_summary(batched)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files or folders (defaults to the repo sample images)")
+    parser.add_argument("--checkpoint", default=model_path)
+    parser.add_argument("--calibration-dir", default=MODEL_CALIBRATION_DIR or None, required=not MODEL_CALIBRATION_DIR,
+                        help="Background-removed shoe crops for INT8 calibration")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    paths = collect_image_paths(args.images)
+    crops = load_crops(paths)
+    if not crops:
+        parser.error("no images found")
+
+    fp32 = TorchBackend(args.checkpoint, precision="fp32")
+    # Calibrating on the scored images would measure agreement on the calibration set
+    int8 = TorchBackend(args.checkpoint, precision="int8", calibration_dir=args.calibration_dir,
+                        calibration_exclude=paths)
+    if not int8.calibration_images:
+        parser.error(f"no calibration images in {args.calibration_dir} besides the scored ones; "
+                     f"pass a separate --calibration-dir")
+
+    fp32_probs, fp32_single, fp32_batch = time_backend(fp32, crops, args.runs)
+    int8_probs, int8_single, int8_batch = time_backend(int8, crops, args.runs)
+
+    rows = np.arange(len(crops))
+    heads = []
+    for col in fp32.columns:
+        f_idx, q_idx = fp32_probs[col].argmax(1), int8_probs[col].argmax(1)
+        drift = np.abs(fp32_probs[col][rows, f_idx] - int8_probs[col][rows, q_idx]) * 100
+        heads.append({
+            "head": col,
+            "top1_agreement": round(float((f_idx == q_idx).mean()), 3),
+            "mean_conf_drift_pp": round(float(drift.mean()), 2),
+            "max_conf_drift_pp": round(float(drift.max()), 2),
+        })
+
+    summary = {
+        "images": len(crops),
+        "scored_images": [os.path.relpath(p) for p in paths],
+        "calibration_images": [os.path.relpath(p) for p in int8.calibration_images],
+        "fp32": {"size_mb": model_size_mb(fp32.model), "single": fp32_single, "batch": fp32_batch},
+        "int8": {"size_mb": model_size_mb(int8.model), "single": int8_single, "batch": int8_batch},
+        "heads": heads,
+    }
+
+    print(f"Scored {len(crops)} images; calibrated on {len(int8.calibration_images)} other images "
+          f"from {args.calibration_dir}")
+    print_table(heads, list(heads[0].keys()))
+    for precision in ("fp32", "int8"):
+        info = summary[precision]
+        print(f"{precision}: {info['size_mb']} MB, single p50 {info['single']['p50_ms']} ms, "
+              f"batch of {len(crops)} p50 {info['batch']['p50_ms']} ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()